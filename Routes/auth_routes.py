@@ -1,32 +1,24 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from datetime import datetime, timedelta
+from typing import Optional
 from models.user_model import UserCreate, UserLogin, RegisterResponse, LoginResponse, UserData
 from db.database import get_admin_collection
-from utils.auth import get_password_hash, verify_password, create_access_token
-import secrets
+from db.counters import admin_ids
+from utils.auth import get_password_hash_async, verify_password_async, create_access_token, get_token_admin_document, new_session_token, end_previous_session
+from bson import ObjectId
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
-security = HTTPBearer()
 
-def get_next_user_id():
+async def get_next_user_id():
     """Get the next available user ID"""
-    user_collection = get_admin_collection()
-    last_user = user_collection.find_one(sort=[("id", -1)])
-    return (last_user["id"] + 1) if last_user else 1
-
-def generate_token():
-    """Generate a Laravel-style token"""
-    token_id = secrets.randbelow(100)
-    random_part = secrets.token_hex(32)
-    return f"{token_id}|{random_part}"
+    return await admin_ids.next_id()
 
 @router.post("/register", response_model=RegisterResponse, status_code=status.HTTP_201_CREATED)
 async def register_user(user: UserCreate):
     user_collection = get_admin_collection()
     
     # Check if user already exists
-    existing_user = user_collection.find_one({"email": user.email})
+    existing_user = await user_collection.find_one({"email": user.email})
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -34,23 +26,24 @@ async def register_user(user: UserCreate):
         )
     
     # Get next user ID
-    user_id = get_next_user_id()
-    
-    # Generate token
-    token = generate_token()
+    user_id = await get_next_user_id()
     
     # Create new user
     user_dict = {
+        "_id": ObjectId(),
         "id": user_id,
         "email": user.email,
         "name": user.name or "User",
-        "hashed_password": get_password_hash(user.password),
-        "token": token,  # Store token in database
+        "hashed_password": await get_password_hash_async(user.password),
         "created_at": datetime.utcnow(),
         "is_active": True
     }
     
-    user_collection.insert_one(user_dict)
+    # Generate token (stored in database)
+    token, token_fields = new_session_token(user_dict, scope="admin")
+    user_dict.update(token_fields)
+    
+    await user_collection.insert_one(user_dict)
     
     # Create response
     return RegisterResponse(
@@ -69,7 +62,7 @@ async def login(credentials: UserLogin):
     user_collection = get_admin_collection()
     
     # Find user by email
-    user = user_collection.find_one({"email": credentials.email})
+    user = await user_collection.find_one({"email": credentials.email})
     
     # Debug logging
     print(f"Login attempt for email: {credentials.email}")
@@ -82,7 +75,7 @@ async def login(credentials: UserLogin):
             detail="User not found. Please register first."
         )
     
-    if not verify_password(credentials.password, user["hashed_password"]):
+    if not await verify_password_async(credentials.password, user["hashed_password"]):
         print("Password verification failed")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -90,13 +83,15 @@ async def login(credentials: UserLogin):
         )
     
     # Generate token
-    token = generate_token()
+    token, token_fields = new_session_token(user, scope="admin")
     
     # Update user with new token in database
-    user_collection.update_one(
+    await user_collection.update_one(
         {"email": credentials.email},
-        {"$set": {"token": token}}
+        {"$set": token_fields}
     )
+    # The previous token is no longer valid
+    await end_previous_session(user, scope="admin")
     
     print(f"Login successful for user: {user['email']}")
     
@@ -113,14 +108,8 @@ async def login(credentials: UserLogin):
     )
 
 @router.get("/me", response_model=dict)
-async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_admin(admin: Optional[dict] = Depends(get_token_admin_document)):
     """Get current admin details using Bearer token"""
-    token = credentials.credentials
-    user_collection = get_admin_collection()
-    
-    # Find admin by token
-    admin = user_collection.find_one({"token": token})
-    
     if not admin:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,26 +1,28 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Body
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, HTTPException, status, Depends, Body, WebSocket, WebSocketDisconnect
 from models.chat_model import ChatMessage, ChatResponse
 from db.database import get_chats_collection, get_user_collection, get_conversation_collection
+from utils.auth import get_token_user, authenticate_user_token
+from utils.chat_hub import chat_hub
+from utils.pagination import PageParams, paginate
+from utils.users import get_public_profiles
+from utils.conversations import conversation_key, upsert_conversation
 from datetime import datetime
+from typing import Optional
 from bson import ObjectId
+import asyncio
 
 chat_router = APIRouter(prefix="/chat", tags=["Chat"])
-security = HTTPBearer()
 
 @chat_router.post("/send", response_model=ChatResponse, status_code=status.HTTP_201_CREATED)
 async def send_message(
     chat: ChatMessage,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    sender: Optional[dict] = Depends(get_token_user)
 ):
     """Send a chat message in a project context."""
-    token = credentials.credentials
     user_collection = get_user_collection()
     chat_collection = get_chats_collection()
     conversation_collection = get_conversation_collection()
     
-    # Verify sender token
-    sender = user_collection.find_one({"token": token})
     if not sender:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -30,30 +32,31 @@ async def send_message(
     sender_email = sender.get("email")
     
     # Verify receiver exists
-    receiver = user_collection.find_one({"email": chat.receiver_email})
+    receiver = await user_collection.find_one({"email": chat.receiver_email})
     if not receiver:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Receiver not found"
         )
     
-    # Check existing conversation between sender and receiver
-    conversation = conversation_collection.find_one({
-        "project_id": chat.project_id,
-        "members": {"$all": [sender_email, chat.receiver_email]}
-    })
+    now = datetime.utcnow()
     
-    if conversation:
-        conversation_id = str(conversation["_id"])
-    else:
-        # Create new conversation
-        new_conv = {
-            "project_id": chat.project_id,
-            "members": [sender_email, chat.receiver_email],
-            "created_at": datetime.utcnow()
-        }
-        conv_result = conversation_collection.insert_one(new_conv)
-        conversation_id = str(conv_result.inserted_id)
+    # Find or create the conversation and update its inbox preview and the
+    # receiver's unread counter in a single upsert
+    conversation = await upsert_conversation(
+        conversation_collection,
+        chat.project_id,
+        [sender_email, chat.receiver_email],
+        update={
+            "$set": {
+                "last_message": {"message": chat.message, "sender_email": sender_email, "created_at": now},
+                "last_message_at": now
+            },
+            "$inc": {f"unread_counts.{receiver['_id']}": 1}
+        },
+        created_at=now
+    )
+    conversation_id = str(conversation["_id"])
     
     # Save message
     chat_dict = {
@@ -62,12 +65,15 @@ async def send_message(
         "sender_email": sender_email,
         "receiver_email": chat.receiver_email,
         "message": chat.message,
-        "created_at": datetime.utcnow()
+        "created_at": now
     }
     
-    result = chat_collection.insert_one(chat_dict)
+    result = await chat_collection.insert_one(chat_dict)
     chat_dict["_id"] = str(result.inserted_id)
     
+    # Push to members connected over WebSocket
+    await chat_hub.publish(conversation_id, chat_dict)
+    
     return {
         "success": True,
         "message": "Message sent successfully",
@@ -75,19 +81,126 @@ async def send_message(
     }
 
 
+@chat_router.get("/conversations")
+async def get_conversation_inbox(
+    page: PageParams = Depends(),
+    user: Optional[dict] = Depends(get_token_user)
+):
+    """List the user's conversations, most recently active first, with last message preview and unread count."""
+    user_collection = get_user_collection()
+    conversation_collection = get_conversation_collection()
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+    
+    user_email = user.get("email")
+    user_id = str(user.get("_id"))
+    
+    conversations, pagination = await paginate(
+        conversation_collection, {"members": user_email}, page, sort_field="last_message_at", direction=-1
+    )
+    
+    # Resolve every counterpart with a single query
+    profiles = await get_public_profiles(
+        user_collection, [m for c in conversations for m in c.get("members", []) if m != user_email]
+    )
+    
+    inbox = []
+    for conversation in conversations:
+        members = conversation.get("members", [])
+        inbox.append({
+            "conversation_id": str(conversation["_id"]),
+            "project_id": conversation.get("project_id"),
+            "members": members,
+            "participants": [profiles[m] for m in members if m != user_email and m in profiles],
+            "last_message": conversation.get("last_message"),
+            "last_message_at": conversation.get("last_message_at"),
+            "unread_count": (conversation.get("unread_counts") or {}).get(user_id, 0),
+            "created_at": conversation.get("created_at")
+        })
+    
+    return {
+        "success": True,
+        "message": "Conversations retrieved successfully",
+        "data": inbox,
+        "pagination": pagination
+    }
+
+
+@chat_router.websocket("/ws/{conversation_id}")
+async def conversation_socket(websocket: WebSocket, conversation_id: str, token: Optional[str] = None):
+    """Stream new messages of a conversation to a connected member as they are sent.
+
+    Authenticate with `?token=<bearer token>` (browsers can't set headers on
+    WebSockets) or an `Authorization: Bearer` header. History is still read
+    through /chat/messages/{conversation_id}.
+    """
+    conversation_collection = get_conversation_collection()
+    
+    # Verify user token
+    if not token:
+        authorization = websocket.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+    user = await authenticate_user_token(token) if token else None
+    if not user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid or expired token")
+        return
+    
+    # Verify conversation exists and user is a member
+    try:
+        conversation = await conversation_collection.find_one({"_id": ObjectId(conversation_id)}, {"members": 1})
+    except Exception:
+        conversation = None
+    if not conversation or user.get("email") not in conversation.get("members", []):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Not a member of this conversation")
+        return
+    
+    await websocket.accept()
+    queue = chat_hub.subscribe(conversation_id)
+    
+    async def receive_until_disconnect():
+        # Incoming frames are ignored; this only notices the client going away
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+    
+    disconnected = asyncio.create_task(receive_until_disconnect())
+    try:
+        while True:
+            next_message = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({next_message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                next_message.cancel()
+                break
+            await websocket.send_json(next_message.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_hub.unsubscribe(conversation_id, queue)
+        disconnected.cancel()
+
+
 @chat_router.get("/messages/{conversation_id}")
 async def get_conversation_messages(
     conversation_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    page: PageParams = Depends(),
+    user: Optional[dict] = Depends(get_token_user)
 ):
-    """Get all messages for a specific conversation with sender and receiver details."""
-    token = credentials.credentials
+    """Get messages for a specific conversation, one page at a time, with sender and receiver details.
+
+    The first page holds the newest messages; `next_cursor` walks back in
+    time. Messages within a page are in chronological order.
+    """
     user_collection = get_user_collection()
     chat_collection = get_chats_collection()
     conversation_collection = get_conversation_collection()
     
-    # Verify user token
-    user = user_collection.find_one({"token": token})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -98,7 +211,7 @@ async def get_conversation_messages(
     
     # Verify conversation exists and user is a member
     try:
-        conversation = conversation_collection.find_one({
+        conversation = await conversation_collection.find_one({
             "_id": ObjectId(conversation_id)
         })
     except:
@@ -122,11 +235,25 @@ async def get_conversation_messages(
         "data": []
         }
     
-    # Get all messages for this conversation
-    messages = list(chat_collection.find({
+    # Opening the conversation marks it as read for this user
+    await conversation_collection.update_one(
+        {"_id": conversation["_id"]},
+        {"$set": {f"unread_counts.{user['_id']}": 0}}
+    )
+    
+    # Get one page of messages for this conversation, newest first
+    messages, pagination = await paginate(chat_collection, {
         "conversation_id": conversation_id,
         "project_id": conversation.get("project_id")
-    }).sort("created_at", 1))
+    }, page, sort_field="created_at", direction=-1,
+        projection={"project_id": 1, "sender_email": 1, "receiver_email": 1, "message": 1, "created_at": 1})
+    messages.reverse()
+    
+    # Resolve the conversation members (plus any other participant in this page) once
+    participant_emails = list(conversation.get("members", []))
+    for msg in messages:
+        participant_emails += [msg.get("sender_email"), msg.get("receiver_email")]
+    profiles = await get_public_profiles(user_collection, participant_emails)
     
     # Enrich messages with sender and receiver details
     enriched_messages = []
@@ -134,42 +261,14 @@ async def get_conversation_messages(
         sender_email = msg.get("sender_email")
         receiver_email = msg.get("receiver_email")
         
-        # Get sender details
-        sender_user = None
-        if sender_email:
-            sender = user_collection.find_one({"email": sender_email})
-            if sender:
-                sender_user = {
-                    "_id": str(sender.get("_id")),
-                    "id": sender.get("id"),
-                    "full_name": sender.get("full_name"),
-                    "email": sender.get("email"),
-                    "profile_photo": sender.get("profile_photo"),
-                    "user_role": sender.get("user_role")
-                }
-        
-        # Get receiver details
-        receiver_user = None
-        if receiver_email:
-            receiver = user_collection.find_one({"email": receiver_email})
-            if receiver:
-                receiver_user = {
-                    "_id": str(receiver.get("_id")),
-                    "id": receiver.get("id"),
-                    "full_name": receiver.get("full_name"),
-                    "email": receiver.get("email"),
-                    "profile_photo": receiver.get("profile_photo"),
-                    "user_role": receiver.get("user_role")
-                }
-        
         enriched_messages.append({
             "_id": str(msg.get("_id")),
             "conversation_id": conversation_id,
             "project_id": msg.get("project_id"),
             "sender_email": sender_email,
-            "sender": sender_user,
+            "sender": profiles.get(sender_email),
             "receiver_email": receiver_email,
-            "receiver": receiver_user,
+            "receiver": profiles.get(receiver_email),
             "message": msg.get("message"),
             "created_at": msg.get("created_at")
         })
@@ -177,7 +276,8 @@ async def get_conversation_messages(
     return {
         "success": True,
         "message": f"Messages for conversation retrieved successfully",
-        "data": enriched_messages
+        "data": enriched_messages,
+        "pagination": pagination
     }
 
 
@@ -186,15 +286,11 @@ async def get_conversation_by_emails(
     user1_email: str,
     user2_email: str,
     project_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    user: Optional[dict] = Depends(get_token_user)
 ):
     """Fetch conversation_id between two users by their emails in a project context."""
-    token = credentials.credentials
-    user_collection = get_user_collection()
     conversation_collection = get_conversation_collection()
     
-    # Verify user token
-    user = user_collection.find_one({"token": token})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -210,29 +306,10 @@ async def get_conversation_by_emails(
             "message": "You are not authorized to access this conversation",
             "data": None
         }
-    # Try to find conversation using different possible project_id types
-    candidate_project_values = [project_id]
-    # Try ObjectId if possible
-    try:
-        candidate_project_values.append(ObjectId(project_id))
-    except Exception:
-        pass
-
-    # Try integer if project_id looks numeric
-    try:
-        if str(project_id).isdigit():
-            candidate_project_values.append(int(project_id))
-    except Exception:
-        pass
-
-    conversation = None
-    for pid in candidate_project_values:
-        conversation = conversation_collection.find_one({
-            "project_id": pid,
-            "members": {"$all": [user1_email, user2_email]}
-        })
-        if conversation:
-            break
+    # Point lookup on the canonical conversation key
+    conversation = await conversation_collection.find_one(
+        {"conversation_key": conversation_key(project_id, [user1_email, user2_email])}
+    )
 
     if conversation:
         return {
@@ -247,24 +324,6 @@ async def get_conversation_by_emails(
             }
         }
 
-    # If not found, attempt a cross-project lookup (helpful if project_id types don't match)
-    fallback = conversation_collection.find_one({
-        "members": {"$all": [user1_email, user2_email]}
-    })
-    if fallback:
-        return {
-            "success": True,
-            "message": "Conversation exists but project_id mismatch detected. Returning found conversation info.",
-            "data": {
-                "conversation_id": str(fallback.get("_id")),
-                "project_id": fallback.get("project_id"),
-                "members": fallback.get("members"),
-                "created_at": fallback.get("created_at"),
-                "exists": True,
-                "note": "This conversation is in a different project or stored with a different project_id type."
-            }
-        }
-
     # No conversation at all
     return {
         "success": False,
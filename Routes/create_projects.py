@@ -1,30 +1,31 @@
 from fastapi import APIRouter, HTTPException, status, Depends, File, UploadFile, Form, Body
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from models.project_model import ProjectModel, ProjectResponse
 from db.database import get_project_collection, get_user_collection
+from db.counters import project_ids
+from utils.auth import get_token_user, user_token_cache
+from utils.pagination import PageParams, paginate
+from utils.users import get_public_profiles
+from utils.uploads import save_upload, delete_upload
+from utils.projects import build_assignment_fields, extract_assigned_ids, normalize_milestones, normalize_tasks, upgrade_project_schema, milestone_status_update, add_project_references, propagate_project_status, remove_project_references, PROJECT_SCHEMA_VERSION
 from datetime import datetime
 from typing import Optional, List
 from bson import ObjectId
-import secrets
-import os
-import shutil
+from pymongo import ReturnDocument
+from config import settings
 import json
 
 project_router = APIRouter(prefix="/projects", tags=["Projects"])
-security = HTTPBearer()
 
-def get_next_project_id():
+async def get_next_project_id():
     """Get the next available project ID"""
-    project_collection = get_project_collection()
-    last_project = project_collection.find_one(sort=[("id", -1)])
-    return (last_project["id"] + 1) if last_project else 1
+    return await project_ids.next_id()
 
 
 
 # CREATE PEOJECT ENDPOINTs...........................
 @project_router.post("/create", status_code=status.HTTP_201_CREATED)
 async def create_project(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Optional[dict] = Depends(get_token_user),
     title: str = Form(...),
     project_type: str = Form(...),
     project_description: str = Form(...),
@@ -56,12 +57,9 @@ async def create_project(
     duration: Optional[str] = Form(None)
 ):
     """Create a new project with file upload support"""
-    token = credentials.credentials
     user_collection = get_user_collection()
     project_collection = get_project_collection()
     
-    # Verify user token
-    user = user_collection.find_one({"token": token})
     if not user:
         return {
             "success": False,
@@ -69,26 +67,13 @@ async def create_project(
         }
     
     # Get next project ID
-    project_id = get_next_project_id()
+    project_id = await get_next_project_id()
     
     # Handle file upload if provided
     file_path = None
     if attached_files is not None:
-        # Create uploads directory
-        upload_dir = "uploads/project_files"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        file_extension = os.path.splitext(attached_files.filename)[1]
-        unique_filename = f"project_{project_id}_{secrets.token_hex(8)}{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(attached_files.file, buffer)
-        
-        # Store relative path
-        file_path = f"/{file_path.replace(os.sep, '/')}"
+        saved = await save_upload(attached_files, settings.MAX_PROJECT_FILE_BYTES)
+        file_path = saved["path"]
     
     # Parse JSON arrays
     assigned_student_list = []
@@ -113,36 +98,7 @@ async def create_project(
             milestones_list = [milestones]
 
     # Normalize milestones: ensure each milestone is a dict with a unique 'id', default status, and tasks with statuses
-    normalized_milestones = []
-    for idx, m in enumerate(milestones_list):
-        if isinstance(m, dict):
-            m_copy = dict(m)
-        else:
-            # if milestone provided as primitive, convert to dict with name
-            m_copy = {"name": m}
-
-        # assign an id if missing
-        if not m_copy.get("id"):
-            m_copy["id"] = f"{project_id}-{idx}-{secrets.token_hex(6)}"
-
-        # ensure status
-        m_copy.setdefault("status", "pending")
-
-        # normalize tasks inside milestone
-        raw_tasks = m_copy.get("tasks", []) or []
-        normalized_tasks = []
-        for t in raw_tasks:
-            if isinstance(t, dict):
-                t_copy = dict(t)
-            else:
-                t_copy = {"title": t}
-            t_copy.setdefault("status", "pending")
-            normalized_tasks.append(t_copy)
-        m_copy["tasks"] = normalized_tasks
-
-        normalized_milestones.append(m_copy)
-    # use normalized_milestones in the project document
-    milestones_list = normalized_milestones
+    milestones_list = normalize_milestones(milestones_list, project_id)
     
     tasks_list = []
     if tasks and tasks.strip():
@@ -150,6 +106,7 @@ async def create_project(
             tasks_list = json.loads(tasks)
         except:
             tasks_list = [tasks]
+    tasks_list = normalize_tasks(tasks_list)
 
     # Normalize deliverables_type into a list. Accepts:
     # - multiple form fields (List[str])
@@ -188,6 +145,7 @@ async def create_project(
         "created_by_email": user.get("email"),
         "assigned_student": assigned_student_list,
         "assigned_mentor": assigned_mentor_list,
+        **build_assignment_fields(assigned_student_list, assigned_mentor_list),
         "project_counsellor": project_counsellor,
         "milestones": milestones_list,
         "tasks": tasks_list,
@@ -211,137 +169,39 @@ async def create_project(
         "purpose": purpose,
         "preferred_time": preferred_time,
         "duration": duration,
+        "schema_version": PROJECT_SCHEMA_VERSION,
         "created_at": datetime.utcnow()
     }
     
     # Insert into database
-    result = project_collection.insert_one(project_dict)
+    result = await project_collection.insert_one(project_dict)
     project_dict["_id"] = str(result.inserted_id)
     
-    # Update assigned students' current_projects field
-    if assigned_student_list:
-        for student_data in assigned_student_list:
-            # Extract student ID from the assigned_student object
-            if isinstance(student_data, dict):
-                student_id = student_data.get("id")
-            else:
-                student_id = student_data
-            
-            if student_id:
-                try:
-                    # Find student by _id (MongoDB ObjectId)
-                    student = user_collection.find_one({"_id": ObjectId(student_id)})
-                    
-                    if student:
-                        # Get current projects list
-                        current_projects = student.get("current_projects", [])
-                        
-                        # Add new project info
-                        project_info = {
-                            "project_id": project_id,
-                            "title": title,
-                            "status": status_field,
-                            "assigned_date": datetime.utcnow()
-                        }
-                        
-                        # Append to current_projects
-                        current_projects.append(project_info)
-                        
-                        # Update student's current_projects
-                        user_collection.update_one(
-                            {"_id": ObjectId(student_id)},
-                            {"$set": {"current_projects": current_projects}}
-                        )
-                except Exception as e:
-                    # Log error but don't fail project creation
-                    print(f"Error updating student {student_id}: {e}")
+    # Add the project to assigned students' current_projects and mentors' assigned_projects
+    unknown_assignees = await add_project_references(user_collection, project_dict)
     
-    # Update assigned mentors' assigned_projects field
-    if assigned_mentor_list:
-        for mentor_data in assigned_mentor_list:
-            # Extract mentor ID from the assigned_mentor object
-            if isinstance(mentor_data, dict):
-                mentor_id = mentor_data.get("id")
-            else:
-                mentor_id = mentor_data
-            
-            if mentor_id:
-                try:
-                    # Find mentor by _id (MongoDB ObjectId)
-                    mentor = user_collection.find_one({"_id": ObjectId(mentor_id)})
-                    
-                    if mentor:
-                        # Get assigned projects list
-                        assigned_projects = mentor.get("assigned_projects", [])
-                        
-                        # Add new project info
-                        project_info = {
-                            "project_id": project_id,
-                            "title": title,
-                            "status": status_field,
-                            "assigned_date": datetime.utcnow()
-                        }
-                        
-                        # Append to assigned_projects
-                        assigned_projects.append(project_info)
-                        
-                        # Update mentor's assigned_projects
-                        user_collection.update_one(
-                            {"_id": ObjectId(mentor_id)},
-                            {"$set": {"assigned_projects": assigned_projects}}
-                        )
-                except Exception as e:
-                    # Log error but don't fail project creation
-                    print(f"Error updating mentor {mentor_id}: {e}")
+    # Cached copies of the updated users are now stale
+    user_token_cache.invalidate_users(project_dict["assigned_student_ids"] + project_dict["assigned_mentor_ids"])
     
     return {
         "success": True,
         "message": "Project created successfully",
-        "data": project_dict
+        "data": project_dict,
+        # Assigned ids that matched no user; the project still lists them
+        "unknown_assignees": unknown_assignees
     }
 
 # ........................Get All Projects Endpoint..........................
 
 @project_router.get("/all_projects")
-async def get_all_projects():
-    """Get all projects"""
+async def get_all_projects(page: PageParams = Depends()):
+    """Get all projects, one page at a time"""
     project_collection = get_project_collection()
-    projects = list(project_collection.find())
+    projects, pagination = await paginate(project_collection, {}, page)
     
     # Convert projects to response format
     project_list = []
     for project in projects:
-        # Ensure milestones and tasks include a status (default 'pending') and project status defaults to 'pending'
-        raw_milestones = project.get("milestones", []) or []
-        processed_milestones = []
-        for m in raw_milestones:
-            if isinstance(m, dict):
-                m_copy = dict(m)
-            else:
-                m_copy = {"name": m}
-            raw_tasks = m_copy.get("tasks", []) or []
-            new_tasks = []
-            for t in raw_tasks:
-                if isinstance(t, dict):
-                    t_copy = dict(t)
-                else:
-                    t_copy = {"title": t}
-                t_copy.setdefault("status", "pending")
-                new_tasks.append(t_copy)
-            m_copy["tasks"] = new_tasks
-            m_copy.setdefault("status", "pending")
-            processed_milestones.append(m_copy)
-
-        raw_tasks = project.get("tasks", []) or []
-        processed_tasks = []
-        for t in raw_tasks:
-            if isinstance(t, dict):
-                t_copy = dict(t)
-            else:
-                t_copy = {"title": t}
-            t_copy.setdefault("status", "pending")
-            processed_tasks.append(t_copy)
-
         project_dict = {
             "id": project.get("id"),
             "title": project.get("title"),
@@ -352,8 +212,8 @@ async def get_all_projects():
             "assigned_student": project.get("assigned_student", []),
             "assigned_mentor": project.get("assigned_mentor", []),
             "project_counsellor": project.get("project_counsellor"),
-            "milestones": processed_milestones,
-            "tasks": processed_tasks,
+            "milestones": project.get("milestones", []),
+            "tasks": project.get("tasks", []),
             "deliverables_title": project.get("deliverables_title"),
             "deliverables_type": project.get("deliverables_type"),
             "due_date": project.get("due_date"),
@@ -381,7 +241,8 @@ async def get_all_projects():
     return {
         "success": True,
         "message": "Projects retrieved successfully",
-        "data": project_list
+        "data": project_list,
+        "pagination": pagination
     }
 
 
@@ -397,43 +258,12 @@ async def get_projects_by_mentor(email: str = None):
     project_collection = get_project_collection()
     try:
         # match mentor entries that are dicts with an email field
-        projects = list(project_collection.find({"assigned_mentor.email": email}))
+        projects = await project_collection.find({"assigned_mentor.email": email}).to_list(None)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to fetch projects: {e}")
 
     project_list = []
     for project in projects:
-        # Ensure milestones and tasks include a status (default 'pending') and project status defaults to 'pending'
-        raw_milestones = project.get("milestones", []) or []
-        processed_milestones = []
-        for m in raw_milestones:
-            if isinstance(m, dict):
-                m_copy = dict(m)
-            else:
-                m_copy = {"name": m}
-            raw_tasks = m_copy.get("tasks", []) or []
-            new_tasks = []
-            for t in raw_tasks:
-                if isinstance(t, dict):
-                    t_copy = dict(t)
-                else:
-                    t_copy = {"title": t}
-                t_copy.setdefault("status", "pending")
-                new_tasks.append(t_copy)
-            m_copy["tasks"] = new_tasks
-            m_copy.setdefault("status", "pending")
-            processed_milestones.append(m_copy)
-
-        raw_tasks = project.get("tasks", []) or []
-        processed_tasks = []
-        for t in raw_tasks:
-            if isinstance(t, dict):
-                t_copy = dict(t)
-            else:
-                t_copy = {"title": t}
-            t_copy.setdefault("status", "pending")
-            processed_tasks.append(t_copy)
-
         project_dict = {
             "id": project.get("id"),
             "title": project.get("title"),
@@ -444,8 +274,8 @@ async def get_projects_by_mentor(email: str = None):
             "assigned_student": project.get("assigned_student", []),
             "assigned_mentor": project.get("assigned_mentor", []),
             "project_counsellor": project.get("project_counsellor"),
-            "milestones": processed_milestones,
-            "tasks": processed_tasks,
+            "milestones": project.get("milestones", []),
+            "tasks": project.get("tasks", []),
             "deliverables_title": project.get("deliverables_title"),
             "deliverables_type": project.get("deliverables_type"),
             "due_date": project.get("due_date"),
@@ -475,14 +305,10 @@ async def get_projects_by_mentor(email: str = None):
 # ........................Get Projects By Creator Email..........................
 
 @project_router.get("/my_projects")
-async def get_my_projects(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_my_projects(user: Optional[dict] = Depends(get_token_user)):
     """Get all projects created by current user using Bearer token"""
-    token = credentials.credentials
-    user_collection = get_user_collection()
     project_collection = get_project_collection()
     
-    # Verify user token
-    user = user_collection.find_one({"token": token})
     if not user:
         return {
             "success": False,
@@ -491,42 +317,11 @@ async def get_my_projects(credentials: HTTPAuthorizationCredentials = Depends(se
     
     # Get projects created by this user
     creator_email = user.get("email")
-    projects = list(project_collection.find({"created_by_email": creator_email}))
+    projects = await project_collection.find({"created_by_email": creator_email}).to_list(None)
     
     # Convert projects to response format
     project_list = []
     for project in projects:
-        # Ensure milestones and tasks include a status (default 'pending') and project status defaults to 'pending'
-        raw_milestones = project.get("milestones", []) or []
-        processed_milestones = []
-        for m in raw_milestones:
-            if isinstance(m, dict):
-                m_copy = dict(m)
-            else:
-                m_copy = {"name": m}
-            raw_tasks = m_copy.get("tasks", []) or []
-            new_tasks = []
-            for t in raw_tasks:
-                if isinstance(t, dict):
-                    t_copy = dict(t)
-                else:
-                    t_copy = {"title": t}
-                t_copy.setdefault("status", "pending")
-                new_tasks.append(t_copy)
-            m_copy["tasks"] = new_tasks
-            m_copy.setdefault("status", "pending")
-            processed_milestones.append(m_copy)
-
-        raw_tasks = project.get("tasks", []) or []
-        processed_tasks = []
-        for t in raw_tasks:
-            if isinstance(t, dict):
-                t_copy = dict(t)
-            else:
-                t_copy = {"title": t}
-            t_copy.setdefault("status", "pending")
-            processed_tasks.append(t_copy)
-
         project_dict = {
             "id": project.get("id"),
             "title": project.get("title"),
@@ -537,8 +332,8 @@ async def get_my_projects(credentials: HTTPAuthorizationCredentials = Depends(se
             "assigned_student": project.get("assigned_student", []),
             "assigned_mentor": project.get("assigned_mentor", []),
             "project_counsellor": project.get("project_counsellor"),
-            "milestones": processed_milestones,
-            "tasks": processed_tasks,
+            "milestones": project.get("milestones", []),
+            "tasks": project.get("tasks", []),
             "deliverables_title": project.get("deliverables_title"),
             "deliverables_type": project.get("deliverables_type"),
             "due_date": project.get("due_date"),
@@ -571,72 +366,55 @@ async def get_my_projects(credentials: HTTPAuthorizationCredentials = Depends(se
 
 
 @project_router.get("/notifications/by_student")
-async def get_project_notifications_for_student(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Return project notifications (title + created_at) for the authenticated student."""
+async def get_project_notifications_for_student(
+    since: Optional[datetime] = None,
+    target_user: Optional[dict] = Depends(get_token_user)
+):
+    """Return project notifications (title + created_at) for the authenticated student.
+
+    Pass `since` (the newest `created_at` already seen) to poll for new projects only.
+    """
 
-    token = credentials.credentials
     project_collection = get_project_collection()
     user_collection = get_user_collection()
 
-    target_user = user_collection.find_one({"token": token})
     if not target_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
     email = target_user.get("email")
     target_user_id = str(target_user.get("_id")) if target_user else None
 
-    notifications = []
-    projects = list(project_collection.find())
+    # Match on the normalized, indexed assignment fields (id or lower-cased email)
+    clauses = []
+    if target_user_id:
+        clauses.append({"assigned_student_ids": target_user_id})
+    if email:
+        clauses.append({"assigned_student_emails": email.lower()})
+    if not clauses:
+        return {"success": True, "message": f"Notifications for {email} retrieved successfully", "data": []}
+    query = {"$or": clauses}
+    if since:
+        query["created_at"] = {"$gt": since}
+
+    projects = await project_collection.find(
+        query,
+        {"id": 1, "title": 1, "status": 1, "created_at": 1, "created_by_email": 1}
+    ).sort("created_at", 1).to_list(None)
+
+    # Resolve every creator with a single query
+    creators = await get_public_profiles(user_collection, [p.get("created_by_email") for p in projects])
 
+    notifications = []
     for project in projects:
-        assigned_students = project.get("assigned_student", []) or []
-        match_found = False
-        for assigned in assigned_students:
-            # Allow dicts with email/id or direct strings (email/id)
-            if isinstance(assigned, dict):
-                assigned_email = assigned.get("email")
-                assigned_id = str(assigned.get("id")) if assigned.get("id") else None
-                if assigned_email and email and assigned_email.lower() == email.lower():
-                    match_found = True
-                    break
-                if target_user_id and assigned_id and assigned_id == target_user_id:
-                    match_found = True
-                    break
-            else:
-                value = str(assigned)
-                if target_user_id and value == target_user_id:
-                    match_found = True
-                    break
-                if email and value.lower() == email.lower():
-                    match_found = True
-                    break
-
-        if match_found:
-            assigned_by_email = project.get("created_by_email")
-            assigned_by_user = None
-            if assigned_by_email:
-                try:
-                    creator = user_collection.find_one({"email": assigned_by_email})
-                    if creator:
-                        assigned_by_user = {
-                            "_id": str(creator.get("_id")),
-                            "id": creator.get("id"),
-                            "full_name": creator.get("full_name"),
-                            "email": creator.get("email"),
-                            "profile_photo": creator.get("profile_photo"),
-                            "user_role": creator.get("user_role"),
-                        }
-                except Exception:
-                    assigned_by_user = None
-
-            notifications.append({
-                "project_id": project.get("id"),
-                "title": project.get("title"),
-                "status": project.get("status", "pending"),
-                "created_at": project.get("created_at"),
-                "assigned_by": assigned_by_email,
-                "assigned_by_user": assigned_by_user
-            })
+        assigned_by_email = project.get("created_by_email")
+        notifications.append({
+            "project_id": project.get("id"),
+            "title": project.get("title"),
+            "status": project.get("status", "pending"),
+            "created_at": project.get("created_at"),
+            "assigned_by": assigned_by_email,
+            "assigned_by_user": creators.get(assigned_by_email)
+        })
 
     return {
         "success": True,
@@ -666,74 +444,30 @@ async def update_project_status(payload: dict = Body(...)):
     except Exception:
         normalized_project_id = project_id
 
-    project = project_collection.find_one({"id": normalized_project_id})
+    project = await project_collection.find_one({"id": normalized_project_id})
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Project with id {project_id} not found")
 
-    project_collection.update_one(
+    # Update students' current_projects and mentors' assigned_projects status first:
+    # if this fails the project keeps its old status and a retry re-applies both
+    await propagate_project_status(user_collection, project, new_status)
+
+    # Refresh the assignment index fields alongside the status so legacy documents self-heal
+    await project_collection.update_one(
         {"id": normalized_project_id},
-        {"$set": {"status": new_status, "updated_at": datetime.utcnow()}}
+        {"$set": {
+            "status": new_status,
+            "updated_at": datetime.utcnow(),
+            **build_assignment_fields(project.get("assigned_student", []), project.get("assigned_mentor", []))
+        }}
     )
 
-    # Update students' current_projects status
-    assigned_students = project.get("assigned_student", []) or []
-    for student in assigned_students:
-        student_id = None
-        if isinstance(student, dict):
-            student_id = student.get("id")
-        else:
-            student_id = student
-
-        if not student_id:
-            continue
-
-        try:
-            user = user_collection.find_one({"_id": ObjectId(student_id)})
-        except Exception:
-            user = None
-
-        if not user:
-            continue
-
-        current_projects = user.get("current_projects", [])
-        updated = False
-        for proj in current_projects:
-            if proj.get("project_id") == project.get("id"):
-                proj["status"] = new_status
-                updated = True
-        if updated:
-            user_collection.update_one({"_id": user["_id"]}, {"$set": {"current_projects": current_projects}})
-
-    # Update mentors' assigned_projects status
-    assigned_mentors = project.get("assigned_mentor", []) or []
-    for mentor in assigned_mentors:
-        mentor_id = None
-        if isinstance(mentor, dict):
-            mentor_id = mentor.get("id")
-        else:
-            mentor_id = mentor
-
-        if not mentor_id:
-            continue
-
-        try:
-            user = user_collection.find_one({"_id": ObjectId(mentor_id)})
-        except Exception:
-            user = None
-
-        if not user:
-            continue
-
-        assigned_projects = user.get("assigned_projects", [])
-        updated = False
-        for proj in assigned_projects:
-            if proj.get("project_id") == project.get("id"):
-                proj["status"] = new_status
-                updated = True
-        if updated:
-            user_collection.update_one({"_id": user["_id"]}, {"$set": {"assigned_projects": assigned_projects}})
+    # Cached copies of the updated users are now stale
+    user_token_cache.invalidate_users(
+        extract_assigned_ids(project.get("assigned_student")) + extract_assigned_ids(project.get("assigned_mentor"))
+    )
 
-    updated_project = project_collection.find_one({"id": normalized_project_id})
+    updated_project = await project_collection.find_one({"id": normalized_project_id})
 
     return {
         "success": True,
@@ -750,15 +484,13 @@ async def update_project_status(payload: dict = Body(...)):
 @project_router.delete("/{project_id}")
 async def delete_project(
     project_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    requesting_user: Optional[dict] = Depends(get_token_user)
 ):
     """Delete a project and remove references from assigned students and mentors."""
     
-    token = credentials.credentials
     project_collection = get_project_collection()
     user_collection = get_user_collection()
     
-    requesting_user = user_collection.find_one({"token": token})
     if not requesting_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
     
@@ -771,7 +503,7 @@ async def delete_project(
     except Exception:
         normalized_project_id = project_id
     
-    project = project_collection.find_one({"id": normalized_project_id})
+    project = await project_collection.find_one({"id": normalized_project_id})
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Project with id {project_id} not found")
     
@@ -783,52 +515,22 @@ async def delete_project(
     if creator_email != requester_email and requester_role not in {"admin", "counsellor"}:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this project")
     
-    # Clean up students' current_projects
-    assigned_students = project.get("assigned_student", []) or []
-    for student in assigned_students:
-        student_id = student.get("id") if isinstance(student, dict) else student
-        if not student_id:
-            continue
-        try:
-            user = user_collection.find_one({"_id": ObjectId(student_id)})
-        except Exception:
-            user = None
-        if not user:
-            continue
-        current_projects = user.get("current_projects", [])
-        filtered = [proj for proj in current_projects if proj.get("project_id") != project.get("id")]
-        if len(filtered) != len(current_projects):
-            user_collection.update_one({"_id": user["_id"]}, {"$set": {"current_projects": filtered}})
+    # Clean up students' current_projects and mentors' assigned_projects
+    await remove_project_references(user_collection, project)
     
-    # Clean up mentors' assigned_projects
-    assigned_mentors = project.get("assigned_mentor", []) or []
-    for mentor in assigned_mentors:
-        mentor_id = mentor.get("id") if isinstance(mentor, dict) else mentor
-        if not mentor_id:
-            continue
-        try:
-            user = user_collection.find_one({"_id": ObjectId(mentor_id)})
-        except Exception:
-            user = None
-        if not user:
-            continue
-        assigned_projects = user.get("assigned_projects", [])
-        filtered = [proj for proj in assigned_projects if proj.get("project_id") != project.get("id")]
-        if len(filtered) != len(assigned_projects):
-            user_collection.update_one({"_id": user["_id"]}, {"$set": {"assigned_projects": filtered}})
+    # Cached copies of the updated users are now stale
+    user_token_cache.invalidate_users(
+        extract_assigned_ids(project.get("assigned_student")) + extract_assigned_ids(project.get("assigned_mentor"))
+    )
     
     # Remove attached project file if stored locally
     attached_file = project.get("attached_files")
     if attached_file:
-        file_path = attached_file.lstrip("/\\")
-        if os.path.isfile(file_path):
-            try:
-                os.remove(file_path)
-            except OSError:
-                pass
+        # files saved before the content-addressed store belong to this project alone
+        await delete_upload(attached_file, remove_untracked=True)
     
     # Delete the project
-    project_collection.delete_one({"id": normalized_project_id})
+    await project_collection.delete_one({"id": normalized_project_id})
     
     return {
         "success": True,
@@ -872,150 +574,51 @@ async def update_milestone_status(
     except Exception:
         project_id_int = project_id
 
-    project = project_collection.find_one({"id": project_id_int})
+    project = await project_collection.find_one({"id": project_id_int}, {"schema_version": 1})
     if not project:
         return {"success": False, "message": f"Project with id {project_id} not found"}
-
-    milestones = project.get("milestones", []) or []
-    modified = False
+    if project.get("schema_version") != PROJECT_SCHEMA_VERSION:
+        await upgrade_project_schema(project_collection, project_id_int)
 
     # helper to save attachment and return public path
     attachment_path = None
     if attachment is not None:
-        upload_dir = "uploads/milestone_attachments"
-        os.makedirs(upload_dir, exist_ok=True)
-        file_extension = os.path.splitext(attachment.filename or "")[1]
-        unique_filename = f"proj_{project_id}_ms_{secrets.token_hex(8)}{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(attachment.file, buffer)
-        attachment_path = f"/{file_path.replace(os.sep, '/')}"
-
-    # If milestone_id provided, match by id; otherwise if milestone_name provided match by name
-    if milestone_id:
-        for m in milestones:
-            m_id = m.get("id") if isinstance(m, dict) else None
-            if m_id == milestone_id:
-                # update milestone status
-                if isinstance(m, dict):
-                    m["status"] = status_value
-                    # attach file to milestone if provided
-                    if attachment_path:
-                        m.setdefault("attachments", []).append(attachment_path)
-                    # If task_title provided, update only that task
-                    if task_title:
-                        tasks = m.get("tasks", []) or []
-                        for t in tasks:
-                            if (isinstance(t, dict) and t.get("title") == task_title) or (not isinstance(t, dict) and t == task_title):
-                                if isinstance(t, dict):
-                                    t["status"] = status_value
-                                    if attachment_path:
-                                        t.setdefault("attachments", []).append(attachment_path)
-                                else:
-                                    idx = tasks.index(t)
-                                    tasks[idx] = {"title": t, "status": status_value, "attachments": ([attachment_path] if attachment_path else [])}
-                                modified = True
-                                break
-                    else:
-                        # update all tasks under this milestone to given status
-                        tasks = m.get("tasks", []) or []
-                        for t in tasks:
-                            if isinstance(t, dict):
-                                t["status"] = status_value
-                                if attachment_path:
-                                    t.setdefault("attachments", []).append(attachment_path)
-                            else:
-                                idx = tasks.index(t)
-                                tasks[idx] = {"title": t, "status": status_value, "attachments": ([attachment_path] if attachment_path else [])}
-                        modified = True
-                else:
-                    idx = milestones.index(m)
-                    new_m = {"name": m, "id": milestone_id, "status": status_value, "tasks": []}
-                    if attachment_path:
-                        new_m["attachments"] = [attachment_path]
-                    milestones[idx] = new_m
-                    modified = True
-                break
-    elif milestone_name:
-        for m in milestones:
-            # allow matching by name (string) or dict name
-            name = m.get("name") if isinstance(m, dict) else None
-            if name == milestone_name:
-                # update milestone status
-                if isinstance(m, dict):
-                    m["status"] = status_value
-                    if attachment_path:
-                        m.setdefault("attachments", []).append(attachment_path)
-                    # If task_title provided, update only that task
-                    if task_title:
-                        tasks = m.get("tasks", []) or []
-                        for t in tasks:
-                            if (isinstance(t, dict) and t.get("title") == task_title) or (not isinstance(t, dict) and t == task_title):
-                                if isinstance(t, dict):
-                                    t["status"] = status_value
-                                    if attachment_path:
-                                        t.setdefault("attachments", []).append(attachment_path)
-                                else:
-                                    idx = tasks.index(t)
-                                    tasks[idx] = {"title": t, "status": status_value, "attachments": ([attachment_path] if attachment_path else [])}
-                                modified = True
-                                break
-                    else:
-                        tasks = m.get("tasks", []) or []
-                        for t in tasks:
-                            if isinstance(t, dict):
-                                t["status"] = status_value
-                                if attachment_path:
-                                    t.setdefault("attachments", []).append(attachment_path)
-                            else:
-                                idx = tasks.index(t)
-                                tasks[idx] = {"title": t, "status": status_value, "attachments": ([attachment_path] if attachment_path else [])}
-                        modified = True
-                else:
-                    idx = milestones.index(m)
-                    new_m = {"name": m, "status": status_value, "tasks": []}
-                    if attachment_path:
-                        new_m["attachments"] = [attachment_path]
-                    milestones[idx] = new_m
-                    modified = True
-                break
-    else:
-        # No specific milestone -> update all milestones and their tasks
-        for i, m in enumerate(milestones):
-            if isinstance(m, dict):
-                m["status"] = status_value
-                if attachment_path:
-                    m.setdefault("attachments", []).append(attachment_path)
-                tasks = m.get("tasks", []) or []
-                for t in tasks:
-                    if isinstance(t, dict):
-                        t["status"] = status_value
-                        if attachment_path:
-                            t.setdefault("attachments", []).append(attachment_path)
-                    else:
-                        idx = tasks.index(t)
-                        tasks[idx] = {"title": t, "status": status_value, "attachments": ([attachment_path] if attachment_path else [])}
-            else:
-                milestones[i] = {"name": m, "status": status_value, "tasks": []}
-                if attachment_path:
-                    milestones[i]["attachments"] = [attachment_path]
-        modified = True
+        saved = await save_upload(attachment, settings.MAX_MILESTONE_ATTACHMENT_BYTES)
+        attachment_path = saved["path"]
+
+    # If milestone_id provided, match by id; otherwise if milestone_name provided match by name;
+    # with neither, every milestone and all of its tasks are updated
+    query, update, array_filters = milestone_status_update(
+        project_id_int,
+        status_value,
+        milestone_id=milestone_id,
+        milestone_name=milestone_name,
+        task_title=task_title,
+        attachment_path=attachment_path,
+    )
 
-    if not modified:
-        # nothing changed (e.g., milestone or task not found)
+    # Single targeted write; concurrent edits to other milestones/tasks are preserved
+    updated = await project_collection.find_one_and_update(
+        query,
+        update,
+        array_filters=array_filters or None,
+        projection={"milestones": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated:
+        # nothing changed (e.g., milestone or task not found); the attachment isn't referenced anywhere
+        if attachment_path:
+            await delete_upload(attachment_path)
         return {"success": False, "message": "No matching milestone/task found or nothing to update"}
 
-    # Persist changes (update milestones array)
-    project_collection.update_one({"id": project_id_int}, {"$set": {"milestones": milestones, "updated_at": datetime.utcnow()}})
-
     # Return updated project excerpt
-    return {"success": True, "message": "Milestone/task status updated", "data": {"project_id": project_id_int, "milestones": milestones}}
+    return {"success": True, "message": "Milestone/task status updated", "data": {"project_id": project_id_int, "milestones": updated.get("milestones", [])}}
 
 
 @project_router.put("/milestone/status")
 async def update_milestone_status_json(
     payload: dict = Body(...),
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    user: Optional[dict] = Depends(get_token_user)
 ):
     """Update the status of a specific milestone (e.g., approved, rejected, pending).
     
@@ -1026,12 +629,8 @@ async def update_milestone_status_json(
         "status": "approved" | "rejected" | "pending" | etc.
     }
     """
-    token = credentials.credentials
-    user_collection = get_user_collection()
     project_collection = get_project_collection()
     
-    # Verify user token
-    user = user_collection.find_one({"token": token})
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
     # Requester's email (derived from token)
@@ -1059,37 +658,33 @@ async def update_milestone_status_json(
     except Exception:
         normalized_project_id = project_id
     
-    project = project_collection.find_one({"id": normalized_project_id})
+    project = await project_collection.find_one({"id": normalized_project_id}, {"schema_version": 1})
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
             detail=f"Project with id {project_id} not found"
         )
+    if project.get("schema_version") != PROJECT_SCHEMA_VERSION:
+        await upgrade_project_schema(project_collection, normalized_project_id)
     
-    milestones = project.get("milestones", []) or []
-    milestone_found = False
-    updated_milestone = None
-    
-    # Find and update the specific milestone
-    for m in milestones:
-        if isinstance(m, dict) and m.get("id") == milestone_id:
-            m["status"] = new_status
-            m["updated_at"] = datetime.utcnow()
-            milestone_found = True
-            updated_milestone = m
-            break
+    # Update only the matching milestone and return it
+    query, update, array_filters = milestone_status_update(
+        normalized_project_id, new_status, milestone_id=milestone_id, include_tasks=False
+    )
+    updated = await project_collection.find_one_and_update(
+        query,
+        update,
+        array_filters=array_filters,
+        projection={"milestones": {"$elemMatch": {"id": milestone_id}}},
+        return_document=ReturnDocument.AFTER,
+    )
     
-    if not milestone_found:
+    if not updated or not updated.get("milestones"):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Milestone with id {milestone_id} not found in project {project_id}"
         )
-    
-    # Update project in database
-    project_collection.update_one(
-        {"id": normalized_project_id},
-        {"$set": {"milestones": milestones, "updated_at": datetime.utcnow()}}
-    )
+    updated_milestone = updated["milestones"][0]
     
     return {
         "success": True,
@@ -1105,18 +700,15 @@ async def update_milestone_status_json(
 @project_router.get("/chat_participants/{project_id}")
 async def get_project_chat_participants(
     project_id: str,
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    user: Optional[dict] = Depends(get_token_user)
 ):
     """Get list of all participants (students, mentors, counsellor) for project chat.
     
     Returns user details of all assigned students, mentors, and counsellor for the project.
     """
-    token = credentials.credentials
     user_collection = get_user_collection()
     project_collection = get_project_collection()
     
-    # Verify user token
-    user = user_collection.find_one({"token": token})
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
     
@@ -1131,7 +723,7 @@ async def get_project_chat_participants(
     except Exception:
         normalized_project_id = project_id
     
-    project = project_collection.find_one({"id": normalized_project_id})
+    project = await project_collection.find_one({"id": normalized_project_id})
     if not project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1150,7 +742,7 @@ async def get_project_chat_participants(
         student_id = student.get("id") if isinstance(student, dict) else student
         if student_id:
             try:
-                student_user = user_collection.find_one({"_id": ObjectId(student_id)})
+                student_user = await user_collection.find_one({"_id": ObjectId(student_id)})
                 if student_user:
                     participants["students"].append({
                         "_id": str(student_user.get("_id")),
@@ -1174,7 +766,7 @@ async def get_project_chat_participants(
         mentor_id = mentor.get("id") if isinstance(mentor, dict) else mentor
         if mentor_id:
             try:
-                mentor_user = user_collection.find_one({"_id": ObjectId(mentor_id)})
+                mentor_user = await user_collection.find_one({"_id": ObjectId(mentor_id)})
                 if mentor_user:
                     participants["mentors"].append({
                         "_id": str(mentor_user.get("_id")),
@@ -1190,7 +782,7 @@ async def get_project_chat_participants(
     # Get counsellor from created_by_email
     counsellor_email = project.get("created_by_email")
     if counsellor_email:
-        counsellor_user = user_collection.find_one({"email": counsellor_email})
+        counsellor_user = await user_collection.find_one({"email": counsellor_email})
         if counsellor_user:
             participants["counsellor"] = {
                 "_id": str(counsellor_user.get("_id")),
@@ -1,39 +1,32 @@
 from fastapi import APIRouter, HTTPException, status, Depends, File, UploadFile, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from models.create_user_model import CreateUserModel, UserResponse, AllUsersResponse, UserData, UpdateUserModel
 from db.database import get_user_collection, get_project_collection
-from utils.auth import get_password_hash, verify_password
+from db.counters import user_ids
+from utils.auth import get_password_hash_async, verify_password_async, get_token_user, get_token_user_document, user_token_cache, new_session_token, end_previous_session
+from utils.pagination import PageParams, paginate
+from utils.projects import assignment_query, assignment_query_many, get_assigned_keys
+from utils.uploads import save_upload, delete_upload
+from utils.users import get_public_profiles
 from datetime import datetime
 from typing import Optional
-import secrets
-import os
-import shutil
+from bson import ObjectId
+from config import settings
 
 user_router = APIRouter(prefix="/users", tags=["Users"])
-security = HTTPBearer()
 
-def get_next_user_id():
+async def get_next_user_id():
     """Get the next available user ID"""
-    user_collection = get_user_collection()
-    last_user = user_collection.find_one(sort=[("id", -1)])
-    return (last_user["id"] + 1) if last_user else 1
-
-def generate_token():
-    """Generate a Laravel-style token"""
-    token_id = secrets.randbelow(100)
-    random_part = secrets.token_hex(32)
-    return f"{token_id}|{random_part}"
-
+    return await user_ids.next_id()
 
-def build_user_profile(user_doc, user_collection, expand_child=False):
+def build_user_profile(user_doc):
     """Build a user profile dict from a DB document.
-    If expand_child=True and `child` is an email, replace it with that child's profile (one level deep).
+    `child` is copied as stored; use `resolve_child_profiles` to expand it.
     """
     if not user_doc:
         return None
 
     # Basic profile mapping (same keys used elsewhere)
-    profile = {
+    return {
         "id": user_doc.get("id"),
         "user_role": user_doc.get("user_role"),
         "full_name": user_doc.get("full_name"),
@@ -59,7 +52,7 @@ def build_user_profile(user_doc, user_collection, expand_child=False):
         "cgpa": user_doc.get("cgpa"),
         "rank": user_doc.get("rank"),
         "current_projects": user_doc.get("current_projects", []),
-        # child will be resolved below
+        "child": user_doc.get("child"),
         "mentor": user_doc.get("mentor"),
         "total_projects": user_doc.get("total_projects", []),
         "completed_project": user_doc.get("completed_project", []),
@@ -67,162 +60,127 @@ def build_user_profile(user_doc, user_collection, expand_child=False):
         "is_active": user_doc.get("is_active", True)
     }
 
-    child_field = user_doc.get("child")
-    # If requested, expand child email into child's profile (one level only)
-    if expand_child:
-        # child stored as email string
-        if isinstance(child_field, str) and "@" in child_field:
-            child_doc = user_collection.find_one({"email": child_field})
-            if child_doc:
-                # Build child's profile but do NOT expand their child to avoid deep recursion
-                child_profile = build_user_profile(child_doc, user_collection, expand_child=False)
-                # attach child's assigned projects
-                try:
-                    project_collection = get_project_collection()
-                    child_profile["assigned_projects"] = get_assigned_projects_for_user(child_doc, project_collection)
-                except Exception:
-                    child_profile["assigned_projects"] = []
-                profile["child"] = child_profile
-            else:
-                profile["child"] = child_field
-        # child stored as a dict (maybe partial profile)
+
+def get_child_email(child_field):
+    """Return the email referenced by a `child` field (email string or dict with `email`), if any."""
+    if isinstance(child_field, dict):
+        child_field = child_field.get("email")
+    if isinstance(child_field, str) and "@" in child_field:
+        return child_field
+    return None
+
+
+async def get_child_docs(user_docs, user_collection):
+    """Fetch the user documents referenced by the `child` fields of `user_docs` in one query, keyed by email."""
+    child_emails = list({email for email in (get_child_email(u.get("child")) for u in user_docs) if email})
+    if not child_emails:
+        return {}
+    child_docs = await user_collection.find({"email": {"$in": child_emails}}).to_list(None)
+    return {doc.get("email"): doc for doc in child_docs}
+
+
+async def resolve_child_profiles(user_docs, user_collection, project_collection):
+    """Expand each user's `child` into that child's profile plus assigned projects (one level deep).
+
+    Children are fetched with a single `$in` query and their projects with a
+    single assignment lookup, so the cost is constant in the number of users.
+    Returns a list aligned with `user_docs`; unresolvable children are returned as stored.
+    """
+    child_docs = await get_child_docs(user_docs, user_collection)
+
+    # Start from the child's full profile when it exists, otherwise from the stored dict
+    profiles = []
+    for user_doc in user_docs:
+        child_field = user_doc.get("child")
+        child_doc = child_docs.get(get_child_email(child_field))
+        if child_doc:
+            profiles.append((build_user_profile(child_doc), child_doc))
         elif isinstance(child_field, dict):
-            # If dict contains an email, try to fetch full profile
-            child_email = child_field.get("email")
-            if isinstance(child_email, str) and "@" in child_email:
-                child_doc = user_collection.find_one({"email": child_email})
-                if child_doc:
-                    child_profile = build_user_profile(child_doc, user_collection, expand_child=False)
-                    try:
-                        project_collection = get_project_collection()
-                        child_profile["assigned_projects"] = get_assigned_projects_for_user(child_doc, project_collection)
-                    except Exception:
-                        child_profile["assigned_projects"] = []
-                    profile["child"] = child_profile
-                else:
-                    # if we can't find full doc, attach what we have and try to compute projects from dict
-                    try:
-                        project_collection = get_project_collection()
-                        profile["child"] = dict(child_field)
-                        profile["child"]["assigned_projects"] = get_assigned_projects_for_user(child_field, project_collection)
-                    except Exception:
-                        profile["child"] = child_field
-            else:
-                # Assume child_field already is a profile-like dict; try to compute assigned projects
-                try:
-                    project_collection = get_project_collection()
-                    profile["child"] = dict(child_field)
-                    profile["child"]["assigned_projects"] = get_assigned_projects_for_user(child_field, project_collection)
-                except Exception:
-                    profile["child"] = child_field
+            profiles.append((dict(child_field), child_field))
         else:
-            profile["child"] = child_field
-    else:
-        profile["child"] = child_field
+            profiles.append((None, None))
 
-    return profile
+    subjects = [subject for _, subject in profiles if subject is not None]
+    try:
+        assigned = iter(await get_assigned_projects_for_users(subjects, project_collection))
+    except Exception:
+        assigned = None
+
+    resolved = []
+    for user_doc, (child_profile, subject) in zip(user_docs, profiles):
+        if child_profile is None:
+            resolved.append(user_doc.get("child"))
+            continue
+        child_profile["assigned_projects"] = next(assigned) if assigned is not None else []
+        resolved.append(child_profile)
+    return resolved
+
+
+def build_project_info(project, include_students=True):
+    """Shape a project document for embedding in a user profile."""
+    project_info = {
+        "project_id": project.get("id"),
+        "title": project.get("title"),
+        "project_type": project.get("project_type"),
+        "project_description": project.get("project_description"),
+        "status": project.get("status", "pending"),
+        "created_by_email": project.get("created_by_email"),
+        "assigned_student": project.get("assigned_student", []),
+        "assigned_mentor": project.get("assigned_mentor", []),
+        "project_counsellor": project.get("project_counsellor"),
+        "milestones": project.get("milestones", []),
+        "tasks": project.get("tasks", []),
+        "due_date": project.get("due_date"),
+        "attached_files": project.get("attached_files"),
+        "created_at": project.get("created_at")
+    }
+    if not include_students:
+        project_info.pop("assigned_student")
+    return project_info
 
 
-def get_assigned_projects_for_user(user_doc, project_collection):
+async def get_assigned_projects_for_user(user_doc, project_collection):
     """Return list of projects assigned to the given user document.
-    Matching by stringified MongoDB _id (primary) or email.
+    Matching by stringified MongoDB _id (primary) or email, via the indexed assignment fields.
     """
-    assigned_projects = []
     try:
-        all_projects = list(project_collection.find())
+        return (await get_assigned_projects_for_users([user_doc], project_collection))[0]
     except Exception:
         return []
 
-    # The primary identifier used in assigned_student/assigned_mentor arrays is the stringified MongoDB ObjectId
-    user_objid_str = None
-    if user_doc.get("_id") is not None:
-        user_objid_str = str(user_doc.get("_id"))
-    
-    user_email = user_doc.get("email")
 
-    for project in all_projects:
-        assigned_students = project.get("assigned_student", []) or []
-        assigned_mentors = project.get("assigned_mentor", []) or []
-        is_assigned = False
-
-        # Check students - the "id" field in assigned_student dicts is the MongoDB ObjectId string
-        for student in assigned_students:
-            if isinstance(student, dict):
-                # Match by _id string (most common) or email
-                if (user_objid_str and student.get("id") == user_objid_str) or \
-                   (user_email and student.get("email") == user_email):
-                    is_assigned = True
-                    break
-            else:
-                # student stored as primitive string (ObjectId)
-                if user_objid_str and str(student) == user_objid_str:
-                    is_assigned = True
-                    break
-
-        # Check mentors if not assigned yet
-        if not is_assigned:
-            for mentor in assigned_mentors:
-                if isinstance(mentor, dict):
-                    if (user_objid_str and mentor.get("id") == user_objid_str) or \
-                       (user_email and mentor.get("email") == user_email):
-                        is_assigned = True
-                        break
-                else:
-                    if user_objid_str and str(mentor) == user_objid_str:
-                        is_assigned = True
-                        break
-
-        if is_assigned:
-            # Build project_info similarly to other endpoints
-            raw_milestones = project.get("milestones", []) or []
-            processed_milestones = []
-            for m in raw_milestones:
-                if isinstance(m, dict):
-                    m_copy = dict(m)
-                else:
-                    m_copy = {"name": m}
-                raw_tasks = m_copy.get("tasks", []) or []
-                new_tasks = []
-                for t in raw_tasks:
-                    if isinstance(t, dict):
-                        t_copy = dict(t)
-                    else:
-                        t_copy = {"title": t}
-                    t_copy.setdefault("status", "pending")
-                    new_tasks.append(t_copy)
-                m_copy["tasks"] = new_tasks
-                m_copy.setdefault("status", "pending")
-                processed_milestones.append(m_copy)
-
-            raw_tasks = project.get("tasks", []) or []
-            processed_tasks = []
-            for t in raw_tasks:
-                if isinstance(t, dict):
-                    t_copy = dict(t)
-                else:
-                    t_copy = {"title": t}
-                t_copy.setdefault("status", "pending")
-                processed_tasks.append(t_copy)
-
-            project_info = {
-                "project_id": project.get("id"),
-                "title": project.get("title"),
-                "project_type": project.get("project_type"),
-                "project_description": project.get("project_description"),
-                "status": project.get("status", "pending"),
-                "created_by_email": project.get("created_by_email"),
-                "assigned_student": project.get("assigned_student", []),
-                "assigned_mentor": project.get("assigned_mentor", []),
-                "project_counsellor": project.get("project_counsellor"),
-                "milestones": processed_milestones,
-                "tasks": processed_tasks,
-                "due_date": project.get("due_date"),
-                "attached_files": project.get("attached_files"),
-                "created_at": project.get("created_at")
-            }
-            assigned_projects.append(project_info)
-
-    return assigned_projects
+async def get_assigned_projects_for_users(user_docs, project_collection, roles=("student", "mentor"), by_email=True, include_students=True):
+    """Batched `get_assigned_projects_for_user`: one indexed query for all `user_docs`.
+
+    Returns a list of project lists aligned with `user_docs`.
+    """
+    assigned = [[] for _ in user_docs]
+    query = assignment_query_many(user_docs, roles=roles, by_email=by_email)
+    if query is None:
+        return assigned
+
+    # Map each id/email back to the positions of the users it belongs to
+    positions_by_id = {}
+    positions_by_email = {}
+    for i, user_doc in enumerate(user_docs):
+        if user_doc.get("_id") is not None:
+            positions_by_id.setdefault(str(user_doc.get("_id")), []).append(i)
+        if by_email and user_doc.get("email"):
+            positions_by_email.setdefault(user_doc.get("email"), []).append(i)
+
+    projects = await project_collection.find(query).to_list(None)
+    for project in projects:
+        assigned_ids, assigned_emails = get_assigned_keys(project, roles=roles)
+        positions = set()
+        for user_id in assigned_ids:
+            positions.update(positions_by_id.get(user_id, []))
+        for email in assigned_emails:
+            positions.update(positions_by_email.get(email, []))
+        if positions:
+            project_info = build_project_info(project, include_students=include_students)
+            for i in sorted(positions):
+                assigned[i].append(project_info)
+    return assigned
 
 # .......................Create User Endpoint..........................
 
@@ -231,7 +189,7 @@ async def create_user(user: CreateUserModel):
     user_collection = get_user_collection()
     
     # Check if user already exists
-    existing_user = user_collection.find_one({"email": user.email})
+    existing_user = await user_collection.find_one({"email": user.email})
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -239,19 +197,16 @@ async def create_user(user: CreateUserModel):
         )
     
     # Get next user ID
-    user_id = get_next_user_id()
-    
-    # Generate token
-    token = generate_token()
+    user_id = await get_next_user_id()
     
     # Create user document
     user_dict = {
+        "_id": ObjectId(),
         "id": user_id,
         "user_role": user.user_role,
         "full_name": user.full_name,
         "email": user.email,
-        "hashed_password": get_password_hash(user.password),
-        "token": token,  # Store token in database
+        "hashed_password": await get_password_hash_async(user.password),
         "phone_number": user.phone_number,
         "location": user.location,
         "child" : user.child,
@@ -281,11 +236,17 @@ async def create_user(user: CreateUserModel):
         "is_active": True
     }
     
+    # Generate token (stored in database)
+    token, token_fields = new_session_token(user_dict)
+    user_dict.update(token_fields)
+    
     # Insert into database
-    result = user_collection.insert_one(user_dict)
+    result = await user_collection.insert_one(user_dict)
     
     # Prepare response (remove hashed_password and _id from response)
     user_dict.pop("hashed_password")
+    user_dict.pop("token_jti", None)
+    user_dict["token"] = token
     user_dict["_id"] = str(result.inserted_id)
     
     return {
@@ -298,137 +259,76 @@ async def create_user(user: CreateUserModel):
     # ........................Get All Users Endpoint..........................
 
 @user_router.get("/all_users", response_model=AllUsersResponse)
-async def get_all_users():
+async def get_all_users(page: PageParams = Depends()):
     user_collection = get_user_collection()
-    users = list(user_collection.find())
+    project_collection = get_project_collection()
+    users, pagination = await paginate(user_collection, {}, page)
+    
+    # Expand every child (if child contains an email) with one batched lookup
+    children = await resolve_child_profiles(users, user_collection, project_collection)
     
     # Convert users to UserData format (without password)
     user_data_list = []
-    for user in users:
-        # Build user profile and expand child (if child contains an email)
-        user_profile = build_user_profile(user, user_collection, expand_child=True)
+    for user, child in zip(users, children):
+        user_profile = build_user_profile(user)
+        user_profile["child"] = child
         user_data_list.append(UserData(**user_profile))
     
     return {
         "success": True,
         "message": "Users retrieved successfully",
-        "data": user_data_list
+        "data": user_data_list,
+        "pagination": pagination
     }
 
 # ........................Get Current User Endpoint.........................."
 
 @user_router.get("/me", response_model=dict)
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(user: Optional[dict] = Depends(get_token_user_document)):
     """Get current user details using Bearer token"""
-    token = credentials.credentials
     user_collection = get_user_collection()
     project_collection = get_project_collection()
     
-    # Find user by token
-    user = user_collection.find_one({"token": token})
-    
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
     
-    # Get user's _id as string for matching
-    user_object_id = str(user.get("_id"))
-    
     # Find all projects where this user is assigned (as student or mentor)
     assigned_projects = []
-    all_projects = list(project_collection.find())
+    all_projects = await project_collection.find(assignment_query(user, by_email=False)).to_list(None)
+    
+    # Resolve every project creator with one query
+    creators = await get_public_profiles(user_collection, [p.get("created_by_email") for p in all_projects])
     
     for project in all_projects:
-        assigned_students = project.get("assigned_student", [])
-        assigned_mentors = project.get("assigned_mentor", [])
-        
-        is_assigned = False
-        
-        # Check if user is in assigned_student list
-        for student in assigned_students:
-            if isinstance(student, dict) and student.get("id") == user_object_id:
-                is_assigned = True
-                break
-        
-        # Check if user is in assigned_mentor list
-        if not is_assigned:
-            for mentor in assigned_mentors:
-                if isinstance(mentor, dict) and mentor.get("id") == user_object_id:
-                    is_assigned = True
-                    break
+        # Get creator user info from created_by_email
+        created_by_email = project.get("created_by_email")
+        created_by_user = creators.get(created_by_email)
         
-        if is_assigned:
-            # Build project details and ensure milestones/tasks have a 'status' field (default 'pending')
-            raw_milestones = project.get("milestones", []) or []
-            processed_milestones = []
-            for m in raw_milestones:
-                if isinstance(m, dict):
-                    m_copy = dict(m)
-                else:
-                    m_copy = {"name": m}
-                # Ensure tasks inside milestone have status
-                raw_tasks = m_copy.get("tasks", []) or []
-                new_tasks = []
-                for t in raw_tasks:
-                    if isinstance(t, dict):
-                        t_copy = dict(t)
-                    else:
-                        t_copy = {"title": t}
-                    t_copy.setdefault("status", "pending")
-                    new_tasks.append(t_copy)
-                m_copy["tasks"] = new_tasks
-                m_copy.setdefault("status", "pending")
-                processed_milestones.append(m_copy)
-
-            # Ensure top-level project tasks have status
-            raw_tasks = project.get("tasks", []) or []
-            processed_tasks = []
-            for t in raw_tasks:
-                if isinstance(t, dict):
-                    t_copy = dict(t)
-                else:
-                    t_copy = {"title": t}
-                t_copy.setdefault("status", "pending")
-                processed_tasks.append(t_copy)
-
-            # Get creator user info from created_by_email
-            created_by_email = project.get("created_by_email")
-            created_by_user = None
-            if created_by_email:
-                creator = user_collection.find_one({"email": created_by_email})
-                if creator:
-                    created_by_user = {
-                        "_id": str(creator.get("_id")),
-                        "id": creator.get("id"),
-                        "full_name": creator.get("full_name"),
-                        "email": creator.get("email"),
-                        "profile_photo": creator.get("profile_photo"),
-                        "user_role": creator.get("user_role")
-                    }
-            
-            project_info = {
-                "project_id": project.get("id"),
-                "title": project.get("title"),
-                "project_type": project.get("project_type"),
-                "project_description": project.get("project_description"),
-                "status": project.get("status", "pending"),
-                "created_by_email": created_by_email,
-                "created_by_user": created_by_user,
-                "assigned_student": project.get("assigned_student", []),
-                "assigned_mentor": project.get("assigned_mentor", []),
-                "project_counsellor": project.get("project_counsellor"),
-                "milestones": processed_milestones,
-                "tasks": processed_tasks,
-                "due_date": project.get("due_date"),
-                "attached_files": project.get("attached_files"),
-                "created_at": project.get("created_at")
-            }
-            assigned_projects.append(project_info)
+        project_info = {
+            "project_id": project.get("id"),
+            "title": project.get("title"),
+            "project_type": project.get("project_type"),
+            "project_description": project.get("project_description"),
+            "status": project.get("status", "pending"),
+            "created_by_email": created_by_email,
+            "created_by_user": created_by_user,
+            "assigned_student": project.get("assigned_student", []),
+            "assigned_mentor": project.get("assigned_mentor", []),
+            "project_counsellor": project.get("project_counsellor"),
+            "milestones": project.get("milestones", []),
+            "tasks": project.get("tasks", []),
+            "due_date": project.get("due_date"),
+            "attached_files": project.get("attached_files"),
+            "created_at": project.get("created_at")
+        }
+        assigned_projects.append(project_info)
     
     # Build user profile including expanded child profile
-    user_dict = build_user_profile(user, user_collection, expand_child=True)
+    user_dict = build_user_profile(user)
+    user_dict["child"] = (await resolve_child_profiles([user], user_collection, project_collection))[0]
     # attach assigned projects
     user_dict["assigned_projects"] = assigned_projects
     
@@ -445,7 +345,7 @@ async def allStudents():
     project_collection = get_project_collection()
     
     # Filter only users having user_role = "Student"
-    students = list(user_collection.find({"user_role": "Student"}))
+    students = await user_collection.find({"user_role": "Student"}).to_list(None)
     
     if not students:
         return {
@@ -454,78 +354,20 @@ async def allStudents():
             "data": []
         }
     
+    # Resolve all children and all assigned projects up front, then assemble in memory
+    child_docs = await get_child_docs(students, user_collection)
+    assigned = await get_assigned_projects_for_users(
+        students, project_collection, roles=("student",), by_email=False, include_students=False
+    )
+    
     # Add assigned projects to each student and expand child profile
-    for student in students:
-        student_object_id = str(student.get("_id"))
-        student["_id"] = student_object_id
+    for student, assigned_projects in zip(students, assigned):
+        student["_id"] = str(student.get("_id"))
 
         # Expand child email (if present) into child's profile
         child_field = student.get("child")
-        if isinstance(child_field, str) and "@" in child_field:
-            child_doc = user_collection.find_one({"email": child_field})
-            if child_doc:
-                student["child"] = build_user_profile(child_doc, user_collection, expand_child=False)
-        
-        # Find all projects where this student is assigned
-        assigned_projects = []
-        all_projects = list(project_collection.find())
-        
-        for project in all_projects:
-            assigned_students = project.get("assigned_student", [])
-            
-            # Check if student is in assigned_student list
-            for assigned_student in assigned_students:
-                if isinstance(assigned_student, dict) and assigned_student.get("id") == student_object_id:
-                    # Build project details and ensure milestones/tasks have a 'status' field (default 'pending')
-                    raw_milestones = project.get("milestones", []) or []
-                    processed_milestones = []
-                    for m in raw_milestones:
-                        if isinstance(m, dict):
-                            m_copy = dict(m)
-                        else:
-                            m_copy = {"name": m}
-                        # Ensure tasks inside milestone have status
-                        raw_tasks = m_copy.get("tasks", []) or []
-                        new_tasks = []
-                        for t in raw_tasks:
-                            if isinstance(t, dict):
-                                t_copy = dict(t)
-                            else:
-                                t_copy = {"title": t}
-                            t_copy.setdefault("status", "pending")
-                            new_tasks.append(t_copy)
-                        m_copy["tasks"] = new_tasks
-                        m_copy.setdefault("status", "pending")
-                        processed_milestones.append(m_copy)
-
-                    # Ensure top-level project tasks have status
-                    raw_tasks = project.get("tasks", []) or []
-                    processed_tasks = []
-                    for t in raw_tasks:
-                        if isinstance(t, dict):
-                            t_copy = dict(t)
-                        else:
-                            t_copy = {"title": t}
-                        t_copy.setdefault("status", "pending")
-                        processed_tasks.append(t_copy)
-
-                    project_info = {
-                        "project_id": project.get("id"),
-                        "title": project.get("title"),
-                        "project_type": project.get("project_type"),
-                        "project_description": project.get("project_description"),
-                        "status": project.get("status", "pending"),
-                        "created_by_email": project.get("created_by_email"),
-                        "assigned_mentor": project.get("assigned_mentor", []),
-                        "project_counsellor": project.get("project_counsellor"),
-                        "milestones": processed_milestones,
-                        "tasks": processed_tasks,
-                        "due_date": project.get("due_date"),
-                        "attached_files": project.get("attached_files"),
-                        "created_at": project.get("created_at")
-                    }
-                    assigned_projects.append(project_info)
-                    break
+        if isinstance(child_field, str) and child_field in child_docs:
+            student["child"] = build_user_profile(child_docs[child_field])
         
         # Add assigned_projects to student data
         student["assigned_projects"] = assigned_projects
@@ -543,7 +385,7 @@ async def allMentors():
     user_collection = get_user_collection()
     
     # Filter only users having user_role = "Mentor"
-    mentors = list(user_collection.find({"user_role": "Mentor"}))
+    mentors = await user_collection.find({"user_role": "Mentor"}).to_list(None)
     
     if not mentors:
         return {
@@ -567,7 +409,7 @@ async def allCounsellors():
     user_collection = get_user_collection()
 
     # Filter only users having user_role = "Counsellor"
-    counsellors = list(user_collection.find({"user_role": "Counsellor"}))
+    counsellors = await user_collection.find({"user_role": "Counsellor"}).to_list(None)
 
     if not counsellors:
         return {
@@ -593,7 +435,7 @@ async def get_user_by_id(user_id: int):
     user_collection = get_user_collection()
     
     # Find user by ID
-    user = user_collection.find_one({"id": user_id})
+    user = await user_collection.find_one({"id": user_id})
     
     if not user:
         raise HTTPException(
@@ -602,7 +444,8 @@ async def get_user_by_id(user_id: int):
         )
     
     # Build user profile and expand child profile
-    user_dict = build_user_profile(user, user_collection, expand_child=True)
+    user_dict = build_user_profile(user)
+    user_dict["child"] = (await resolve_child_profiles([user], user_collection, get_project_collection()))[0]
     
     return {
         "success": True,
@@ -614,7 +457,7 @@ async def get_user_by_id(user_id: int):
 
 @user_router.put("/update")
 async def update_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Optional[dict] = Depends(get_token_user),
     user_role: Optional[str] = Form(None),
     full_name: Optional[str] = Form(None),
     phone_number: Optional[str] = Form(None),
@@ -645,12 +488,8 @@ async def update_user(
     """Update user details using Bearer token with file upload support"""
     import json
     
-    token = credentials.credentials
     user_collection = get_user_collection()
     
-    # Find user by token
-    user = user_collection.find_one({"token": token})
-    
     if not user:
         return {
             "success": False,
@@ -671,21 +510,10 @@ async def update_user(
     
     # Handle profile photo upload
     if profile_photo is not None:
-        # Create uploads directory if not exists
-        upload_dir = "uploads/profile_photos"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        file_extension = os.path.splitext(profile_photo.filename)[1]
-        unique_filename = f"user_{user['id']}_{secrets.token_hex(8)}{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(profile_photo.file, buffer)
+        saved = await save_upload(profile_photo, settings.MAX_PROFILE_PHOTO_BYTES)
         
         # Store relative path in database
-        update_data["profile_photo"] = f"/{file_path.replace(os.sep, '/')}"
+        update_data["profile_photo"] = saved["path"]
     
     if about_me is not None:
         update_data["about_me"] = about_me
@@ -768,13 +596,20 @@ async def update_user(
     update_data["updated_at"] = datetime.utcnow()
     
     # Update user in database
-    user_collection.update_one(
+    previous = await user_collection.find_one_and_update(
         {"_id": user["_id"]},
-        {"$set": update_data}
+        {"$set": update_data},
+        projection={"profile_photo": 1}
     )
+    user_token_cache.invalidate_user(user["_id"])
+    
+    # Release the replaced photo; re-uploading the same photo gives the same
+    # path, and releasing it drops the extra reference save_upload just took
+    if "profile_photo" in update_data and previous:
+        await delete_upload(previous.get("profile_photo"))
     
     # Get updated user
-    updated_user = user_collection.find_one({"_id": user["_id"]})
+    updated_user = await user_collection.find_one({"_id": user["_id"]})
     
     # Convert to response format (without password)
     user_dict = {
@@ -830,26 +665,29 @@ async def user_login(payload: dict):
         )
 
     user_collection = get_user_collection()
-    user = user_collection.find_one({"email": email})
+    user = await user_collection.find_one({"email": email})
     if not user:
         return {
             "success" : False,
             "message" : "User not found. Please register first."
         }
         
-    if not verify_password(password, user.get("hashed_password", "")):
+    if not await verify_password_async(password, user.get("hashed_password", "")):
         return {
             "success" : False,
             "message" : "Incorrect password"
         }
 
     # Generate a new token and store it
-    token = generate_token()
-    user_collection.update_one({"_id": user["_id"]}, {"$set": {"token": token}})
+    token, token_fields = new_session_token(user)
+    await user_collection.update_one({"_id": user["_id"]}, {"$set": token_fields})
+    # The previous token is no longer valid
+    await end_previous_session(user)
 
     # Prepare response without sensitive fields
     user["token"] = token
     user.pop("hashed_password", None)
+    user.pop("token_jti", None)
     user["_id"] = str(user["_id"])
 
     return {
@@ -1,16 +1,28 @@
 from fastapi import APIRouter, HTTPException, status, Depends, File, UploadFile, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from db.database import get_ticket_collection, get_user_collection
+from utils.auth import get_token_user
+from utils.pagination import PageParams, paginate
+from utils.uploads import save_upload, delete_upload
 from models.ticket_model import TicketModel
 from typing import List, Optional
 from datetime import datetime
-import os
-import shutil
-import secrets
+from config import settings
 from bson.objectid import ObjectId
 
 ticket_router = APIRouter(prefix="/tickets", tags=["Tickets"])
-security = HTTPBearer()
+
+# Fields of the raising user that are safe to embed in a ticket response
+RAISED_BY_USER_FIELDS = ["id", "full_name", "email", "profile_photo", "user_role", "phone_number", "created_at"]
+
+
+def build_raised_by_user(user_doc):
+    """Sanitized view of the user who raised a ticket."""
+    if not user_doc:
+        return None
+    raised_user = {"_id": str(user_doc.get("_id"))}
+    for field in RAISED_BY_USER_FIELDS:
+        raised_user[field] = user_doc.get(field)
+    return raised_user
 
 
 @ticket_router.post("/create", response_model=dict, status_code=status.HTTP_201_CREATED)
@@ -20,15 +32,11 @@ async def create_ticket(
     priority: str = Form(...),
     explaination: str = Form(...),
     attachments: Optional[List[UploadFile]] = File(None),
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Optional[dict] = Depends(get_token_user),
 ):
     """Create a ticket (multipart/form-data). `raised_by` is set from the caller's token."""
-    token = credentials.credentials
-    user_collection = get_user_collection()
     ticket_collection = get_ticket_collection()
 
-    # Resolve user by token
-    user = user_collection.find_one({"token": token})
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
@@ -37,16 +45,15 @@ async def create_ticket(
     # Handle file attachments
     attachment_paths: List[str] = []
     if attachments:
-        upload_dir = "uploads/ticket_attachments"
-        os.makedirs(upload_dir, exist_ok=True)
         for up in attachments:
             try:
-                ext = os.path.splitext(up.filename)[1]
-                fname = f"ticket_{secrets.token_hex(8)}{ext}"
-                dest = os.path.join(upload_dir, fname)
-                with open(dest, "wb") as f:
-                    shutil.copyfileobj(up.file, f)
-                attachment_paths.append(f"/{dest.replace(os.sep, '/')}")
+                saved = await save_upload(up, settings.MAX_TICKET_ATTACHMENT_BYTES)
+                attachment_paths.append(saved["path"])
+            except HTTPException:
+                # an oversized file rejects the whole ticket; drop what was already saved
+                for path in attachment_paths:
+                    await delete_upload(path)
+                raise
             except Exception:
                 # skip problematic files but continue
                 continue
@@ -62,7 +69,7 @@ async def create_ticket(
         "status": "Pending",
     }
 
-    result = ticket_collection.insert_one(ticket_doc)
+    result = await ticket_collection.insert_one(ticket_doc)
     ticket_doc["_id"] = str(result.inserted_id)
 
     ticket_model = TicketModel(**ticket_doc)
@@ -79,12 +86,35 @@ async def create_ticket(
 
 
 @ticket_router.get("/all_tickets")
-async def get_all_tickets():
-    """Return all tickets."""
+async def get_all_tickets(
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    project_name: Optional[str] = None,
+    page: PageParams = Depends(),
+):
+    """Return tickets, optionally filtered by status/priority/project_name, one page at a time."""
     ticket_collection = get_ticket_collection()
-    tickets = list(ticket_collection.find())
     user_collection = get_user_collection()
 
+    query = {}
+    if status:
+        query["status"] = status
+    if priority:
+        query["priority"] = priority
+    if project_name:
+        query["project_name"] = project_name
+
+    tickets, pagination = await paginate(ticket_collection, query, page)
+    total = await ticket_collection.count_documents(query)
+
+    # Fetch every raising user in one query instead of one per ticket
+    emails = list({t.get("raised_by") for t in tickets if t.get("raised_by")})
+    users_by_email = {}
+    if emails:
+        projection = {field: 1 for field in RAISED_BY_USER_FIELDS}
+        async for u in user_collection.find({"email": {"$in": emails}}, projection):
+            users_by_email[u.get("email")] = u
+
     # Convert ObjectId to string for each ticket
     out = []
     for t in tickets:
@@ -93,44 +123,24 @@ async def get_all_tickets():
         # Ensure attachments exists
         t_copy["attachments"] = t_copy.get("attachments", [])
         # Attach raised_by user data (sanitized)
-        raised_by_email = t_copy.get("raised_by")
-        raised_user = None
-        if raised_by_email:
-            try:
-                user = user_collection.find_one({"email": raised_by_email})
-                if user:
-                    raised_user = {
-                        "_id": str(user.get("_id")),
-                        "id": user.get("id"),
-                        "full_name": user.get("full_name"),
-                        "email": user.get("email"),
-                        "profile_photo": user.get("profile_photo"),
-                        "user_role": user.get("user_role"),
-                        "phone_number": user.get("phone_number"),
-                        "created_at": user.get("created_at")
-                    }
-            except Exception:
-                raised_user = None
-
-        t_copy["raised_by_user"] = raised_user
+        t_copy["raised_by_user"] = build_raised_by_user(users_by_email.get(t_copy.get("raised_by")))
         out.append(t_copy)
 
     return {
         "success": True,
         "message": "Tickets retrieved successfully",
         "data": out,
+        "total": total,
+        "pagination": pagination,
     }
 
 
 @ticket_router.put("/update_status/{ticket_id}", response_model=dict)
-async def update_ticket_status(ticket_id: str, status: str = Form(...), message: Optional[str] = Form(None), credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def update_ticket_status(ticket_id: str, status: str = Form(...), message: Optional[str] = Form(None), user: Optional[dict] = Depends(get_token_user)):
     """Update the status of a ticket. Requires Authorization Bearer token."""
-    token = credentials.credentials
     user_collection = get_user_collection()
     ticket_collection = get_ticket_collection()
 
-    # Verify requester
-    user = user_collection.find_one({"token": token})
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
@@ -148,12 +158,12 @@ async def update_ticket_status(ticket_id: str, status: str = Form(...), message:
         "changed_at": datetime.utcnow()
     }
 
-    result = ticket_collection.update_one({"_id": oid}, {"$set": {"status": status}, "$push": {"status_history": history_entry}})
+    result = await ticket_collection.update_one({"_id": oid}, {"$set": {"status": status}, "$push": {"status_history": history_entry}})
     if result.matched_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found")
 
     # Return updated ticket
-    ticket = ticket_collection.find_one({"_id": oid})
+    ticket = await ticket_collection.find_one({"_id": oid})
     if not ticket:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found after update")
 
@@ -166,18 +176,7 @@ async def update_ticket_status(ticket_id: str, status: str = Form(...), message:
     raised_user = None
     if raised_by_email:
         try:
-            u = user_collection.find_one({"email": raised_by_email})
-            if u:
-                raised_user = {
-                    "_id": str(u.get("_id")),
-                    "id": u.get("id"),
-                    "full_name": u.get("full_name"),
-                    "email": u.get("email"),
-                    "profile_photo": u.get("profile_photo"),
-                    "user_role": u.get("user_role"),
-                    "phone_number": u.get("phone_number"),
-                    "created_at": u.get("created_at")
-                }
+            raised_user = build_raised_by_user(await user_collection.find_one({"email": raised_by_email}))
         except Exception:
             raised_user = None
 
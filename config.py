@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 class Settings(BaseSettings):
     MONGODB_URI: str
@@ -7,6 +8,30 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_TTL_SECONDS: int = 60
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    JWT_AUTH_ENABLED: bool = False
+    TOKEN_REVOCATION_REFRESH_SECONDS: int = 30
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+    ID_BLOCK_SIZE: int = 1
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 500
+    CHAT_BROKER: str = "local"
+    CHAT_SUBSCRIBER_QUEUE_SIZE: int = 100
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    MAX_TICKET_ATTACHMENT_BYTES: int = 10 * 1024 * 1024
+    MAX_PROFILE_PHOTO_BYTES: int = 5 * 1024 * 1024
+    MAX_PROJECT_FILE_BYTES: int = 50 * 1024 * 1024
+    MAX_MILESTONE_ATTACHMENT_BYTES: int = 25 * 1024 * 1024
+    STORAGE_BACKEND: str = "local"
+    S3_BUCKET: Optional[str] = None
+    S3_ENDPOINT_URL: Optional[str] = None
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_PRESIGNED_URL_SECONDS: int = 3600
+    UPLOADS_CACHE_MAX_AGE_SECONDS: int = 31536000
     
     class Config:
         env_file = ".env"
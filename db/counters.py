@@ -0,0 +1,60 @@
+from pymongo import ReturnDocument
+from db.database import get_database, get_counters_collection
+from config import settings
+import asyncio
+
+
+class SequenceAllocator:
+    """Hands out sequential integer ids backed by a document in the counters collection.
+
+    Every allocation is an atomic `$inc`, so concurrent creates (across
+    workers too) never get the same id. With `block_size > 1` each worker
+    reserves that many ids per round-trip and serves them from memory; ids
+    stay unique but may leave gaps when a worker restarts.
+
+    On first use the counter is seeded from the highest `id` already in
+    `collection_name`, so existing data keeps its numbering.
+    """
+
+    def __init__(self, name: str, collection_name: str, block_size: int = 1):
+        self.name = name
+        self.collection_name = collection_name
+        self.block_size = max(block_size, 1)
+        self._next = 0
+        self._end = 0
+        self._seeded = False
+        self._lock = asyncio.Lock()
+
+    async def _seed(self):
+        counters = get_counters_collection()
+        if await counters.find_one({"_id": self.name}) is None:
+            last = await get_database()[self.collection_name].find_one(sort=[("id", -1)], projection={"id": 1})
+            # $max keeps this idempotent if several workers seed at once
+            await counters.update_one(
+                {"_id": self.name},
+                {"$max": {"value": (last or {}).get("id") or 0}},
+                upsert=True,
+            )
+        self._seeded = True
+
+    async def next_id(self) -> int:
+        async with self._lock:
+            if self._next >= self._end:
+                if not self._seeded:
+                    await self._seed()
+                counter = await get_counters_collection().find_one_and_update(
+                    {"_id": self.name},
+                    {"$inc": {"value": self.block_size}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                self._end = counter["value"] + 1
+                self._next = self._end - self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+
+user_ids = SequenceAllocator("users", "users", settings.ID_BLOCK_SIZE)
+admin_ids = SequenceAllocator("admins", "admins", settings.ID_BLOCK_SIZE)
+project_ids = SequenceAllocator("projects", "projects", settings.ID_BLOCK_SIZE)
@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
 from pymongo.errors import ConnectionFailure
 from config import settings
 import logging
@@ -6,13 +6,14 @@ import logging
 logger = logging.getLogger(__name__)
 
 class Database:
-    client: MongoClient = None
+    client: AsyncMongoClient = None
     
     @classmethod
-    def connect_db(cls):
+    async def connect_db(cls):
         try:
-            # Simplified connection for Python 3.13 compatibility
-            cls.client = MongoClient(
+            # PyMongo's native async client: collection calls are awaited so
+            # route handlers never block the event loop on a DB round-trip.
+            cls.client = AsyncMongoClient(
                 settings.MONGODB_URI,
                 serverSelectionTimeoutMS=10000,
                 connectTimeoutMS=20000,
@@ -20,7 +21,7 @@ class Database:
             )
             
             # Test connection
-            cls.client.admin.command('ping')
+            await cls.client.admin.command('ping')
             logger.info("Successfully connected to MongoDB!")
         except ConnectionFailure as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
@@ -31,9 +32,9 @@ class Database:
             logger.warning("Server starting without database connection. Database will be unavailable.")
     
     @classmethod
-    def close_db(cls):
+    async def close_db(cls):
         if cls.client:
-            cls.client.close()
+            await cls.client.close()
             logger.info("MongoDB connection closed")
     
     @classmethod
@@ -73,4 +74,16 @@ def get_chats_collection():
 
 def get_conversation_collection():
     db = get_database()
-    return db["conversations"]
\ No newline at end of file
+    return db["conversations"]
+
+def get_revoked_tokens_collection():
+    db = get_database()
+    return db["revoked_tokens"]
+
+def get_counters_collection():
+    db = get_database()
+    return db["counters"]
+
+def get_stored_files_collection():
+    db = get_database()
+    return db["stored_files"]
\ No newline at end of file
@@ -0,0 +1,131 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from db.database import get_database
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Indexes backing the lookups the routers perform, keyed by collection name.
+# Names are explicit so re-running the bootstrap is a no-op once they exist.
+INDEX_MANIFEST = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel(
+            [("token", ASCENDING)],
+            name="token_unique",
+            unique=True,
+            partialFilterExpression={"token": {"$type": "string"}},
+        ),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_role", ASCENDING)], name="user_role"),
+    ],
+    "admins": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel(
+            [("token", ASCENDING)],
+            name="token_unique",
+            unique=True,
+            partialFilterExpression={"token": {"$type": "string"}},
+        ),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "projects": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_by_email", ASCENDING)], name="created_by_email"),
+        IndexModel([("assigned_student_ids", ASCENDING)], name="assigned_student_ids"),
+        IndexModel([("assigned_student.email", ASCENDING)], name="assigned_student_email"),
+        IndexModel([("assigned_mentor_ids", ASCENDING)], name="assigned_mentor_ids"),
+        IndexModel([("assigned_mentor.email", ASCENDING)], name="assigned_mentor_email"),
+        IndexModel([("assigned_student_emails", ASCENDING), ("created_at", ASCENDING)], name="assigned_student_emails_created_at"),
+        IndexModel([("assigned_student_ids", ASCENDING), ("created_at", ASCENDING)], name="assigned_student_ids_created_at"),
+        IndexModel([("assigned_mentor_emails", ASCENDING)], name="assigned_mentor_emails"),
+    ],
+    "tickets": [
+        IndexModel([("raised_by", ASCENDING)], name="raised_by"),
+        IndexModel([("status", ASCENDING)], name="status"),
+        IndexModel([("priority", ASCENDING)], name="priority"),
+        IndexModel([("project_name", ASCENDING)], name="project_name"),
+    ],
+    "meetings": [
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+        IndexModel([("link_created_by", ASCENDING), ("created_at", DESCENDING)], name="link_created_by_created_at"),
+        IndexModel(
+            [("project_counsellor_email", ASCENDING), ("created_at", DESCENDING)],
+            name="project_counsellor_email_created_at",
+        ),
+        IndexModel(
+            [("request_by_meeting", ASCENDING), ("created_at", DESCENDING)],
+            name="request_by_meeting_created_at",
+        ),
+        IndexModel([("mentor", ASCENDING)], name="mentor"),
+        IndexModel([("mentor.email", ASCENDING)], name="mentor_email"),
+        IndexModel([("counsellor", ASCENDING)], name="counsellor"),
+        IndexModel([("counsellor.email", ASCENDING)], name="counsellor_email"),
+        IndexModel(
+            [("assigned_student_emails", ASCENDING), ("created_at", DESCENDING)],
+            name="assigned_student_emails_created_at",
+        ),
+    ],
+    "chats": [
+        IndexModel([("conversation_id", ASCENDING), ("created_at", ASCENDING)], name="conversation_id_created_at"),
+    ],
+    "conversations": [
+        IndexModel([("members", ASCENDING), ("last_message_at", DESCENDING), ("_id", DESCENDING)], name="members_last_message_at"),
+        # One conversation per member pair and project; legacy documents without a key are ignored
+        IndexModel(
+            [("conversation_key", ASCENDING)],
+            name="conversation_key_unique",
+            unique=True,
+            partialFilterExpression={"conversation_key": {"$type": "string"}},
+        ),
+    ],
+    "revoked_tokens": [
+        IndexModel([("jti", ASCENDING)], name="jti_unique", unique=True),
+        # Entries are only needed until the revoked token would have expired anyway
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+async def ensure_indexes():
+    """Create every index in INDEX_MANIFEST that does not exist yet.
+
+    Returns a report with one entry per index and a status of `created`,
+    `exists` or `failed` (e.g. a unique index blocked by duplicate data).
+    A failure on one index never prevents the others from being built.
+    """
+    db = get_database()
+    report = []
+
+    for collection_name, indexes in INDEX_MANIFEST.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        for index in indexes:
+            name = index.document["name"]
+            entry = {"collection": collection_name, "index": name}
+            if name in existing:
+                entry["status"] = "exists"
+            else:
+                try:
+                    await collection.create_indexes([index])
+                    entry["status"] = "created"
+                except Exception as e:
+                    entry["status"] = "failed"
+                    entry["error"] = str(e)
+            report.append(entry)
+
+    return report
+
+
+def log_index_report(report):
+    """Log a one-line summary of an `ensure_indexes` report plus any changes."""
+    for entry in report:
+        if entry["status"] == "created":
+            logger.info(f"Created index {entry['collection']}.{entry['index']}")
+        elif entry["status"] == "failed":
+            logger.error(f"Failed to create index {entry['collection']}.{entry['index']}: {entry['error']}")
+
+    created = sum(1 for e in report if e["status"] == "created")
+    present = sum(1 for e in report if e["status"] == "exists")
+    failed = sum(1 for e in report if e["status"] == "failed")
+    logger.info(f"Index bootstrap complete: {created} created, {present} already present, {failed} failed")
@@ -1,15 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from db.database import Database
-import asyncio
+from db.indexes import ensure_indexes, log_index_report
+from utils.auth import password_pool, user_token_cache, admin_token_cache, get_token_admin
+from utils.chat_hub import chat_hub
+from utils.storage import storage
+from utils.static_uploads import UploadsStaticFiles
 from Routes.auth_routes import router as auth_router
 from Routes.create_user import user_router
 from Routes.create_projects import project_router
 from Routes.tickets import ticket_router
 from Routes.meetings import meeting_router
 from Routes.chat import chat_router
+from typing import Optional
 import logging
 import os
 
@@ -21,16 +25,25 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up Teen Theory Backend...")
-    # Run blocking DB connection in a thread to avoid blocking the event loop
     try:
-        await asyncio.to_thread(Database.connect_db)
+        await Database.connect_db()
     except Exception as e:
         logger.error(f"Error while connecting to database in startup: {e}")
+    # Build any missing indexes; keep the report around for inspection
+    app.state.index_report = []
+    try:
+        app.state.index_report = await ensure_indexes()
+        log_index_report(app.state.index_report)
+    except Exception as e:
+        logger.error(f"Error while creating database indexes in startup: {e}")
+    await chat_hub.start()
     yield
     # Shutdown
     logger.info("Shutting down Teen Theory Backend...")
+    password_pool.shutdown()
+    await chat_hub.stop()
     try:
-        await asyncio.to_thread(Database.close_db)
+        await Database.close_db()
     except Exception as e:
         logger.error(f"Error while closing database in shutdown: {e}")
 
@@ -58,11 +71,17 @@ app.include_router(ticket_router)
 app.include_router(meeting_router)
 app.include_router(chat_router)
 
-# Mount static files for uploads
-uploads_dir = "uploads"
-if not os.path.exists(uploads_dir):
-    os.makedirs(uploads_dir)
-app.mount("/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+# Serve uploads: straight from disk with local storage, otherwise by
+# redirecting to a presigned URL so the bytes never pass through the API
+if storage.serves_locally:
+    uploads_dir = "uploads"
+    if not os.path.exists(uploads_dir):
+        os.makedirs(uploads_dir)
+    app.mount("/uploads", UploadsStaticFiles(directory=uploads_dir), name="uploads")
+else:
+    @app.get("/uploads/{key:path}", include_in_schema=False)
+    async def uploads(key: str):
+        return await storage.download_redirect(key)
 
 @app.get("/")
 async def root():
@@ -70,4 +89,16 @@ async def root():
         "message": "Welcome to Teen Theory API",
         "version": "1.0.0",
         "status": "running"
+    }
+
+@app.get("/metrics")
+async def metrics(admin: Optional[dict] = Depends(get_token_admin)):
+    """In-process counters for the auth hot paths (per worker); admins only"""
+    if not admin:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
+    return {
+        "password_pool": password_pool.stats(),
+        "user_token_cache": user_token_cache.stats(),
+        "admin_token_cache": admin_token_cache.stats(),
+        "chat_hub": chat_hub.stats(),
     }
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""One-off data migrations.
+
+Usage:
+    python migrate.py <migration> [<migration> ...]
+    python migrate.py --list
+"""
+from db.database import Database, get_project_collection, get_meetings_collection, get_conversation_collection, get_chats_collection, get_stored_files_collection
+from utils.meetings import meeting_student_emails
+from utils.conversations import conversation_key, normalize_project_id
+from utils.storage import storage
+from utils.uploads import UPLOAD_ROOT, INCOMING_DIR, public_path
+from utils.projects import build_assignment_fields, normalized_project_fields, PROJECT_SCHEMA_VERSION
+from pymongo import UpdateOne
+from collections import defaultdict
+import argparse
+import asyncio
+import mimetypes
+import os
+
+BATCH_SIZE = 500
+
+
+async def _bulk_update(collection, ops_iter):
+    """Run the `UpdateOne`s yielded by the async iterable `ops_iter` in unordered batches of BATCH_SIZE.
+
+    Returns the number of documents modified.
+    """
+    updated = 0
+    ops = []
+    async for op in ops_iter:
+        ops.append(op)
+        if len(ops) >= BATCH_SIZE:
+            result = await collection.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            ops = []
+    if ops:
+        result = await collection.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+    return updated
+
+
+async def backfill_project_assignments():
+    """Populate the normalized assigned_*_ids/assigned_*_emails fields on every project."""
+    project_collection = get_project_collection()
+    cursor = project_collection.find({}, {"assigned_student": 1, "assigned_mentor": 1})
+
+    async def ops():
+        async for project in cursor:
+            fields = build_assignment_fields(project.get("assigned_student", []), project.get("assigned_mentor", []))
+            yield UpdateOne({"_id": project["_id"]}, {"$set": fields})
+
+    updated = await _bulk_update(project_collection, ops())
+    return f"{updated} project(s) updated"
+
+
+async def normalize_project_schema():
+    """Rewrite legacy project milestones/tasks into the canonical stored shape."""
+    project_collection = get_project_collection()
+    cursor = project_collection.find(
+        {"schema_version": {"$ne": PROJECT_SCHEMA_VERSION}},
+        {"id": 1, "status": 1, "milestones": 1, "tasks": 1},
+    )
+
+    async def ops():
+        async for project in cursor:
+            yield UpdateOne({"_id": project["_id"]}, {"$set": normalized_project_fields(project)})
+
+    updated = await _bulk_update(project_collection, ops())
+    return f"{updated} project(s) updated"
+
+
+async def backfill_meeting_students():
+    """Populate the normalized assigned_student_emails field on every meeting."""
+    meetings_collection = get_meetings_collection()
+    cursor = meetings_collection.find(
+        {"$or": [{"assigned_students": {"$exists": True}}, {"Assigned_students": {"$exists": True}}]},
+        {"assigned_students": 1, "Assigned_students": 1},
+    )
+
+    async def ops():
+        async for meeting in cursor:
+            yield UpdateOne({"_id": meeting["_id"]}, {"$set": {"assigned_student_emails": meeting_student_emails(meeting)}})
+
+    updated = await _bulk_update(meetings_collection, ops())
+    return f"{updated} meeting(s) updated"
+
+
+async def backfill_conversation_inbox():
+    """Populate last_message/last_message_at on conversations from their newest chat message."""
+    conversation_collection = get_conversation_collection()
+    chat_collection = get_chats_collection()
+    cursor = conversation_collection.find({"last_message_at": {"$exists": False}}, {"created_at": 1})
+
+    async def ops():
+        async for conversation in cursor:
+            latest = await chat_collection.find_one(
+                {"conversation_id": str(conversation["_id"])}, sort=[("created_at", -1)]
+            )
+            if latest:
+                fields = {
+                    "last_message": {
+                        "message": latest.get("message"),
+                        "sender_email": latest.get("sender_email"),
+                        "created_at": latest.get("created_at"),
+                    },
+                    "last_message_at": latest.get("created_at"),
+                }
+            else:
+                # keeps empty conversations in the recency-sorted inbox
+                fields = {"last_message": None, "last_message_at": conversation.get("created_at")}
+            yield UpdateOne({"_id": conversation["_id"]}, {"$set": fields})
+
+    updated = await _bulk_update(conversation_collection, ops())
+    return f"{updated} conversation(s) updated"
+
+
+async def backfill_conversation_keys():
+    """Set conversation_key on every conversation, merging duplicates of the same pair and project.
+
+    The oldest conversation of each group is kept; messages of the others are
+    moved onto it, along with the newest preview and the summed unread counts.
+    Messages get the same normalized project_id as their conversation, since
+    /chat/messages filters on it.
+    """
+    conversation_collection = get_conversation_collection()
+    chat_collection = get_chats_collection()
+    cursor = conversation_collection.find(
+        {}, {"project_id": 1, "members": 1, "created_at": 1, "last_message": 1, "last_message_at": 1, "unread_counts": 1}
+    )
+
+    groups = defaultdict(list)
+    async for conversation in cursor:
+        groups[conversation_key(conversation.get("project_id"), conversation.get("members") or [])].append(conversation)
+
+    merged = 0
+
+    async def ops():
+        nonlocal merged
+        for key, conversations in groups.items():
+            conversations.sort(key=lambda c: (c.get("created_at") is None, c.get("created_at") or 0, c["_id"]))
+            keeper, duplicates = conversations[0], conversations[1:]
+            project_id = normalize_project_id(keeper.get("project_id"))
+            fields = {"conversation_key": key, "project_id": project_id}
+
+            if duplicates or any(c.get("project_id") != project_id for c in conversations):
+                await chat_collection.update_many(
+                    {"conversation_id": {"$in": [str(c["_id"]) for c in conversations]}},
+                    {"$set": {"conversation_id": str(keeper["_id"]), "project_id": project_id}},
+                )
+
+            if duplicates:
+                duplicate_ids = [c["_id"] for c in duplicates]
+                newest = max(conversations, key=lambda c: (c.get("last_message_at") is not None, c.get("last_message_at") or 0))
+                unread_counts = defaultdict(int)
+                for conversation in conversations:
+                    for user_id, count in (conversation.get("unread_counts") or {}).items():
+                        unread_counts[user_id] += count
+                fields.update({
+                    "last_message": newest.get("last_message"),
+                    "last_message_at": newest.get("last_message_at"),
+                    "unread_counts": dict(unread_counts),
+                })
+                await conversation_collection.delete_many({"_id": {"$in": duplicate_ids}})
+                merged += len(duplicates)
+
+            yield UpdateOne({"_id": keeper["_id"]}, {"$set": fields})
+
+    updated = await _bulk_update(conversation_collection, ops())
+    return f"{updated} conversation(s) updated, {merged} duplicate(s) merged"
+
+
+async def copy_uploads_to_storage():
+    """Copy files under the local uploads/ directory into the configured STORAGE_BACKEND.
+
+    Run after switching to a remote backend so existing /uploads/... paths
+    keep resolving. Content-addressed objects are copied only while a
+    `stored_files` record still references them; older randomly named files
+    are always copied. Objects already in storage are skipped.
+    """
+    if storage.serves_locally:
+        return "storage backend is local, nothing to copy"
+
+    stored_files = get_stored_files_collection()
+    copied = 0
+    skipped = 0
+    for directory, _, filenames in os.walk(UPLOAD_ROOT):
+        if os.path.abspath(directory).startswith(os.path.abspath(INCOMING_DIR)):
+            continue
+        for filename in filenames:
+            file_path = os.path.join(directory, filename)
+            key = os.path.relpath(file_path, UPLOAD_ROOT).replace(os.sep, "/")
+            if key.startswith("objects/") and not await stored_files.find_one({"_id": public_path(key)}, {"_id": 1}):
+                skipped += 1
+                continue
+            if await storage.exists(key):
+                skipped += 1
+                continue
+            await storage.put(file_path, key, mimetypes.guess_type(filename)[0])
+            copied += 1
+
+    return f"{copied} file(s) copied, {skipped} skipped"
+
+
+MIGRATIONS = {
+    "project-assignments": backfill_project_assignments,
+    "project-schema": normalize_project_schema,
+    "meeting-students": backfill_meeting_students,
+    "conversation-inbox": backfill_conversation_inbox,
+    "conversation-keys": backfill_conversation_keys,
+    "uploads-to-storage": copy_uploads_to_storage,
+}
+
+
+async def main(names):
+    await Database.connect_db()
+    try:
+        for name in names:
+            summary = await MIGRATIONS[name]()
+            print(f"{name}: {summary}")
+    finally:
+        await Database.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one-off data migrations")
+    parser.add_argument("migrations", nargs="*", help="migrations to run, in order")
+    parser.add_argument("--list", action="store_true", help="list available migrations")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.migrations if name not in MIGRATIONS]
+    if unknown:
+        parser.error(f"unknown migration(s): {', '.join(unknown)}")
+
+    if args.list or not args.migrations:
+        for name, func in MIGRATIONS.items():
+            print(f"{name}: {func.__doc__}")
+    else:
+        asyncio.run(main(args.migrations))
@@ -79,6 +79,7 @@ class AllUsersResponse(BaseModel):
     success: bool
     message: str
     data: list[UserData]
+    pagination: Optional[dict] = None
 
 class UpdateUserModel(BaseModel):
     child: Optional[Union[str, dict]] = None
@@ -1,36 +1,43 @@
 """Script to create a test user in the database"""
 from db.database import Database, get_user_collection
+from db.counters import user_ids
 from utils.auth import get_password_hash
 from datetime import datetime
+import asyncio
 
-# Connect to database
-Database.connect_db()
+async def main():
+    # Connect to database
+    await Database.connect_db()
 
-user_collection = get_user_collection()
+    user_collection = get_user_collection()
 
-# Check if user already exists
-existing_user = user_collection.find_one({"email": "admin@example.com"})
+    # Check if user already exists
+    existing_user = await user_collection.find_one({"email": "admin@example.com"})
 
-if existing_user:
-    print("User already exists!")
-    print(f"ID: {existing_user['id']}")
-    print(f"Name: {existing_user['name']}")
-    print(f"Email: {existing_user['email']}")
-else:
-    # Create test user
-    test_user = {
-        "id": 1,
-        "email": "admin@example.com",
-        "name": "Demo Admin",
-        "hashed_password": get_password_hash("123456"),
-        "created_at": datetime.utcnow(),
-        "is_active": True
-    }
-    
-    user_collection.insert_one(test_user)
-    print("Test user created successfully!")
-    print(f"Email: admin@example.com")
-    print(f"Password: 123456")
+    if existing_user:
+        print("User already exists!")
+        print(f"ID: {existing_user['id']}")
+        print(f"Name: {existing_user['name']}")
+        print(f"Email: {existing_user['email']}")
+    else:
+        # Create test user
+        test_user = {
+            "id": await user_ids.next_id(),
+            "email": "admin@example.com",
+            "name": "Demo Admin",
+            "hashed_password": get_password_hash("123456"),
+            "created_at": datetime.utcnow(),
+            "is_active": True
+        }
+        
+        await user_collection.insert_one(test_user)
+        print("Test user created successfully!")
+        print(f"Email: admin@example.com")
+        print(f"Password: 123456")
 
-# Close database connection
-Database.close_db()
+    # Close database connection
+    await Database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
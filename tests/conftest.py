@@ -0,0 +1,90 @@
+"""Shared fixtures: settings for an isolated run and an in-memory MongoDB.
+
+The database is mongomock wrapped in the small async surface the app uses
+(awaited collection methods, cursors with `to_list` / `async for`).
+"""
+import os
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "teen_theory_test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import mongomock
+import pytest
+from db.database import Database
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, n):
+        self._cursor = self._cursor.limit(n)
+        return self
+
+    async def to_list(self, length=None):
+        docs = list(self._cursor)
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        self._iter = iter(self._cursor)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return AsyncCollection(self._database[name])
+
+
+class AsyncClient:
+    def __init__(self):
+        self._client = mongomock.MongoClient()
+
+    def __getitem__(self, name):
+        return AsyncDatabase(self._client[name])
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database behind `Database.client` for one test."""
+    previous = Database.client
+    Database.client = AsyncClient()
+    yield Database.get_db()
+    Database.client = previous
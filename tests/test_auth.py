@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from config import settings
+from db.database import get_user_collection
+from utils import auth
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def jwt_mode(db, monkeypatch):
+    monkeypatch.setattr(settings, "JWT_AUTH_ENABLED", True)
+    monkeypatch.setattr(auth, "revoked_tokens", auth.RevocationList(refresh_interval=0))
+
+
+async def test_jwt_identity_comes_from_claims_and_revocation_rejects_it(jwt_mode):
+    user = {"_id": ObjectId(), "id": 3, "email": "a@x.com", "user_role": "Student", "full_name": "A"}
+    token, fields = auth.new_session_token(user)
+    assert fields["token"] is None
+
+    # no user document exists, so this can only have come from the claims
+    identity = await auth.authenticate_user_token(token)
+    assert identity == {"_id": user["_id"], "id": 3, "email": "a@x.com", "user_role": "Student"}
+    # profile fields aren't carried in the token, they go stale as soon as the profile changes
+    assert "full_name" not in auth.verify_token(token)
+    assert await auth._authenticate(token, "admin") is None
+
+    await get_user_collection().insert_one({**user, **fields})
+    await auth.end_previous_session({**user, **fields})
+    assert await auth.authenticate_user_token(token) is None
+
+
+def test_token_cache_invalidates_every_token_of_a_user():
+    cache = auth.TokenCache(maxsize=10, ttl=60)
+    user = {"_id": ObjectId(), "email": "a@x.com"}
+    cache.set("t1", user)
+    cache.set("t2", user)
+    assert cache.get("t1")["email"] == "a@x.com"
+
+    cache.invalidate_user(user["_id"])
+    assert cache.get("t1") is None and cache.get("t2") is None
+
+
+async def test_password_job_keeps_its_slot_until_its_thread_finishes():
+    pool = auth.PasswordWorkerPool(workers=1, max_queue=0)
+    release = threading.Event()
+    task = asyncio.create_task(pool.run(release.wait, 5))
+    await asyncio.sleep(0.05)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    # the bcrypt call is still running on the thread, so the pool is still full
+    with pytest.raises(HTTPException) as exc:
+        await pool.run(release.wait, 5)
+    assert exc.value.status_code == 429
+
+    release.set()
+    for _ in range(100):
+        if pool.pending == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert pool.stats()["completed"] == 1
+    assert await pool.run(release.wait, 5) is True
+    pool.shutdown()
+
+
+async def test_resolved_user_is_a_copy_of_the_cached_document(db):
+    cache = auth.TokenCache(maxsize=10, ttl=60)
+    await get_user_collection().insert_one({"email": "a@x.com", "token": "t1"})
+
+    user = await auth._resolve_token("t1", get_user_collection(), cache)
+    user["email"] = "changed@x.com"
+
+    assert cache.get("t1")["email"] == "a@x.com"
@@ -0,0 +1,29 @@
+import pytest
+from bson import ObjectId
+from utils.chat_hub import ChatHub, LocalBroker
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_published_messages_reach_only_that_conversations_subscribers():
+    hub = ChatHub(LocalBroker(), queue_size=10)
+    queue = hub.subscribe("c1")
+    other = hub.subscribe("c2")
+
+    await hub.publish("c1", {"_id": ObjectId(), "message": "hi"})
+
+    delivered = queue.get_nowait()
+    assert delivered["message"] == "hi"
+    assert isinstance(delivered["_id"], str)
+    assert other.empty()
+
+
+async def test_slow_subscriber_drops_overflow_and_unsubscribe_cleans_up():
+    hub = ChatHub(LocalBroker(), queue_size=2)
+    queue = hub.subscribe("c1")
+    for n in range(3):
+        await hub.publish("c1", {"_id": n, "message": str(n)})
+
+    assert [queue.get_nowait()["message"] for _ in range(queue.qsize())] == ["0", "1"]
+    hub.unsubscribe("c1", queue)
+    assert hub.stats() == {"conversations": 0, "subscribers": 0}
@@ -0,0 +1,51 @@
+from datetime import datetime
+import pytest
+import migrate
+from db.database import get_conversation_collection, get_chats_collection
+from utils.conversations import conversation_key, upsert_conversation
+
+pytestmark = pytest.mark.anyio
+
+
+def test_conversation_key_ignores_member_order_case_and_project_id_type():
+    assert conversation_key(7, ["b@x.com", "A@x.com"]) == conversation_key("7", ["a@x.com", "b@x.com"])
+    assert conversation_key(7, ["a@x.com", "b@x.com"]) != conversation_key(8, ["a@x.com", "b@x.com"])
+
+
+async def test_upsert_conversation_reuses_the_existing_document(db):
+    conversations = get_conversation_collection()
+    first = await upsert_conversation(conversations, 1, ["a@x.com", "b@x.com"], {"$inc": {"unread_counts.u1": 1}})
+    second = await upsert_conversation(conversations, "1", ["b@x.com", "a@x.com"], {"$inc": {"unread_counts.u1": 1}})
+
+    assert first["_id"] == second["_id"]
+    assert second["unread_counts"] == {"u1": 2}
+    assert await conversations.count_documents({}) == 1
+
+
+async def test_backfill_conversation_keys_merges_duplicates_into_the_oldest(db):
+    conversations = get_conversation_collection()
+    chats = get_chats_collection()
+    old = await conversations.insert_one({
+        "project_id": "1", "members": ["b@x.com", "a@x.com"], "created_at": datetime(2024, 1, 1),
+        "last_message_at": datetime(2024, 1, 2), "last_message": {"message": "old"}, "unread_counts": {"u1": 2},
+    })
+    new = await conversations.insert_one({
+        "project_id": 1, "members": ["a@x.com", "b@x.com"], "created_at": datetime(2024, 2, 1),
+        "last_message_at": datetime(2024, 2, 2), "last_message": {"message": "new"}, "unread_counts": {"u1": 1},
+    })
+    await chats.insert_one({"conversation_id": str(old.inserted_id), "project_id": "1", "message": "old"})
+    await chats.insert_one({"conversation_id": str(new.inserted_id), "project_id": 1, "message": "new"})
+
+    assert await migrate.backfill_conversation_keys() == "1 conversation(s) updated, 1 duplicate(s) merged"
+
+    remaining = await conversations.find({}).to_list(None)
+    assert len(remaining) == 1
+    keeper = remaining[0]
+    assert keeper["_id"] == old.inserted_id
+    assert keeper["conversation_key"] == conversation_key(1, ["a@x.com", "b@x.com"])
+    assert keeper["project_id"] == 1
+    assert keeper["last_message"] == {"message": "new"}
+    assert keeper["unread_counts"] == {"u1": 3}
+    # every message follows the keeper, with the project_id /chat/messages filters on
+    messages = await chats.find({}).to_list(None)
+    assert {(m["conversation_id"], m["project_id"]) for m in messages} == {(str(old.inserted_id), 1)}
@@ -0,0 +1,49 @@
+import asyncio
+import pytest
+from db.counters import SequenceAllocator
+from db.database import get_counters_collection, get_project_collection
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_counter_is_seeded_from_the_highest_existing_id(db):
+    await get_project_collection().insert_many([{"id": 4}, {"id": 41}, {"title": "legacy without id"}])
+    allocator = SequenceAllocator("projects", "projects")
+
+    assert [await allocator.next_id() for _ in range(3)] == [42, 43, 44]
+
+
+async def test_empty_collection_starts_at_one(db):
+    allocator = SequenceAllocator("projects", "projects", block_size=5)
+
+    assert await allocator.next_id() == 1
+
+
+async def test_allocators_sharing_a_counter_never_hand_out_the_same_id(db):
+    await get_project_collection().insert_one({"id": 10})
+    first = SequenceAllocator("projects", "projects", block_size=3)
+    second = SequenceAllocator("projects", "projects", block_size=3)
+
+    ids = await asyncio.gather(*[allocator.next_id() for _ in range(10) for allocator in (first, second)])
+
+    assert len(set(ids)) == len(ids) == 20
+    assert min(ids) == 11
+
+
+async def test_seeding_never_moves_a_counter_backwards(db, monkeypatch):
+    await get_project_collection().insert_one({"id": 10})
+    first = SequenceAllocator("projects", "projects", block_size=5)
+    second = SequenceAllocator("projects", "projects", block_size=5)
+    assert await first.next_id() == 11
+
+    # `second` looked for the counter before `first` created it, so it seeds as well
+    async def counter_not_found_yet(*args, **kwargs):
+        return None
+
+    counters = get_counters_collection()
+    monkeypatch.setattr(counters, "find_one", counter_not_found_yet, raising=False)
+    monkeypatch.setattr("db.counters.get_counters_collection", lambda: counters)
+    await second._seed()
+
+    assert (await get_counters_collection().find_one({"_id": "projects"}))["value"] == 15
+    assert await second.next_id() == 16
@@ -0,0 +1,28 @@
+import pytest
+from pymongo import UpdateOne
+import migrate
+from db.database import get_project_collection
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_bulk_update_writes_in_batches_and_counts_modified(db, monkeypatch):
+    monkeypatch.setattr(migrate, "BATCH_SIZE", 2)
+    collection = get_project_collection()
+    await collection.insert_many([{"id": i} for i in range(5)])
+    batches = []
+    bulk_write = collection.bulk_write
+
+    async def recording_bulk_write(ops, **kwargs):
+        batches.append(len(ops))
+        return await bulk_write(ops, **kwargs)
+
+    monkeypatch.setattr(collection, "bulk_write", recording_bulk_write, raising=False)
+
+    async def ops():
+        for i in range(5):
+            yield UpdateOne({"id": i}, {"$set": {"done": True}})
+
+    assert await migrate._bulk_update(collection, ops()) == 5
+    assert batches == [2, 2, 1]
+    assert await collection.count_documents({"done": True}) == 5
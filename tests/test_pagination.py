@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import HTTPException
+import pytest
+from db.database import get_database
+from utils.pagination import PageParams, decode_cursor, encode_cursor, paginate
+
+pytestmark = pytest.mark.anyio
+
+
+def page(limit, after=None):
+    return PageParams(limit=limit, after=after)
+
+
+def test_cursor_round_trips_id_and_sort_value():
+    doc = {"_id": ObjectId(), "created_at": datetime(2024, 5, 1, 12, 30)}
+    assert decode_cursor(encode_cursor(doc)) == [doc["_id"]]
+    assert decode_cursor(encode_cursor(doc, "created_at"), "created_at") == [doc["created_at"], doc["_id"]]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "W10=", encode_cursor({"_id": 1})])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, "created_at")
+    assert exc.value.status_code == 400
+
+
+async def walk(collection, limit, **kwargs):
+    pages, after = [], None
+    while True:
+        docs, pagination = await paginate(collection, {}, page(limit, after), **kwargs)
+        pages.append([doc["n"] for doc in docs])
+        after = pagination["next_cursor"]
+        assert pagination["has_more"] == (after is not None)
+        if not after:
+            return pages
+
+
+async def test_paginate_walks_every_document_once_by_id(db):
+    collection = get_database()["items"]
+    await collection.insert_many([{"n": n} for n in range(5)])
+    assert await walk(collection, 2) == [[0, 1], [2, 3], [4]]
+
+
+async def test_paginate_breaks_sort_ties_on_id_in_both_directions(db):
+    collection = get_database()["items"]
+    start = datetime(2024, 1, 1)
+    # n=1 and n=2 share a timestamp, so the cursor must fall back to _id
+    await collection.insert_many([
+        {"n": n, "created_at": start + timedelta(minutes=minute)} for n, minute in [(0, 0), (1, 1), (2, 1), (3, 2)]
+    ])
+    assert await walk(collection, 2, sort_field="created_at") == [[0, 1], [2, 3]]
+    assert await walk(collection, 3, sort_field="created_at", direction=-1) == [[3, 2, 1], [0]]
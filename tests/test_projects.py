@@ -0,0 +1,122 @@
+import io
+from datetime import datetime
+from bson import ObjectId
+from starlette.datastructures import UploadFile
+import pytest
+import utils.uploads as uploads
+from db.database import get_project_collection, get_stored_files_collection
+from Routes.create_projects import update_milestone_status
+from utils.projects import PROJECT_SCHEMA_VERSION, milestone_status_update, project_status_updates
+from utils.storage import LocalStorage
+
+NOW = datetime(2026, 1, 1)
+
+
+def test_milestone_matched_by_id_updates_it_and_all_its_tasks():
+    query, update, array_filters = milestone_status_update(7, "done", milestone_id="m1", milestone_name="ignored", now=NOW)
+
+    assert query == {"id": 7, "milestones": {"$elemMatch": {"id": "m1"}}}
+    assert array_filters == [{"m.id": "m1"}]
+    assert update == {
+        "$set": {
+            "milestones.$[m].status": "done",
+            "milestones.$[m].tasks.$[].status": "done",
+            "milestones.$[m].updated_at": NOW,
+            "updated_at": NOW,
+        }
+    }
+
+
+def test_milestone_matched_by_name_without_an_id():
+    query, update, array_filters = milestone_status_update(7, "done", milestone_name="Design", now=NOW)
+
+    assert query["milestones"] == {"$elemMatch": {"name": "Design"}}
+    assert array_filters == [{"m.name": "Design"}]
+
+
+def test_task_title_updates_only_that_task():
+    query, update, array_filters = milestone_status_update(7, "done", milestone_id="m1", task_title="Wireframes", now=NOW)
+
+    # the milestone must actually contain the task, or nothing matches
+    assert query["milestones"] == {"$elemMatch": {"id": "m1", "tasks.title": "Wireframes"}}
+    assert array_filters == [{"m.id": "m1"}, {"t.title": "Wireframes"}]
+    assert update["$set"]["milestones.$[m].tasks.$[t].status"] == "done"
+    assert "milestones.$[m].tasks.$[].status" not in update["$set"]
+
+
+def test_without_a_milestone_every_milestone_and_task_is_updated():
+    query, update, array_filters = milestone_status_update(7, "done", task_title="ignored without a milestone", now=NOW)
+
+    assert query == {"id": 7}
+    assert array_filters == []
+    assert update["$set"]["milestones.$[].status"] == "done"
+    assert update["$set"]["milestones.$[].tasks.$[].status"] == "done"
+
+
+def test_attachment_is_pushed_to_the_milestone_and_its_updated_tasks():
+    _, update, _ = milestone_status_update(7, "done", milestone_id="m1", task_title="Wireframes", attachment_path="/uploads/a.pdf", now=NOW)
+
+    assert update["$push"] == {
+        "milestones.$[m].attachments": "/uploads/a.pdf",
+        "milestones.$[m].tasks.$[t].attachments": "/uploads/a.pdf",
+    }
+
+
+def test_milestone_only_update_leaves_tasks_alone():
+    _, update, array_filters = milestone_status_update(7, "approved", milestone_id="m1", attachment_path="/uploads/a.pdf", include_tasks=False, now=NOW)
+
+    assert array_filters == [{"m.id": "m1"}]
+    assert update == {
+        "$set": {"milestones.$[m].status": "approved", "milestones.$[m].updated_at": NOW, "updated_at": NOW},
+        "$push": {"milestones.$[m].attachments": "/uploads/a.pdf"},
+    }
+
+
+@pytest.mark.anyio
+async def test_no_matching_milestone_fails_and_releases_the_attachment(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(uploads, "storage", LocalStorage())
+    milestones = [{"id": "m1", "name": "Design", "status": "pending", "tasks": []}]
+    await get_project_collection().insert_one({"id": 7, "schema_version": PROJECT_SCHEMA_VERSION, "milestones": milestones})
+
+    result = await update_milestone_status(
+        project_id="7",
+        status="done",
+        milestone_id="missing",
+        milestone_name=None,
+        task_title=None,
+        attachment=UploadFile(io.BytesIO(b"report"), filename="report.pdf"),
+    )
+
+    assert result["success"] is False
+    assert await get_stored_files_collection().count_documents({}) == 0
+    assert list((tmp_path / "uploads" / "objects").rglob("*.pdf")) == []
+    assert (await get_project_collection().find_one({"id": 7}))["milestones"] == milestones
+
+
+def test_project_status_is_set_on_each_assigned_role():
+    student, mentor = ObjectId(), ObjectId()
+    project = {
+        "id": 7,
+        "assigned_student": [{"id": str(student)}, "not-an-id"],
+        "assigned_mentor": [str(mentor)],
+    }
+
+    assert project_status_updates(project, "completed") == [
+        (
+            {"_id": {"$in": [student]}, "current_projects.project_id": 7},
+            {"$set": {"current_projects.$[p].status": "completed"}},
+            [{"p.project_id": 7}],
+        ),
+        (
+            {"_id": {"$in": [mentor]}, "assigned_projects.project_id": 7},
+            {"$set": {"assigned_projects.$[p].status": "completed"}},
+            [{"p.project_id": 7}],
+        ),
+    ]
+
+
+def test_project_status_skips_roles_without_valid_users():
+    project = {"id": 7, "assigned_student": [{"email": "only@example.com"}], "assigned_mentor": []}
+
+    assert project_status_updates(project, "completed") == []
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from utils.static_uploads import UploadFileResponse, UploadsStaticFiles
+
+CONTENT = bytes(range(256)) * 40
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+OBJECT_URL = f"/uploads/objects/{SHA256[:2]}/{SHA256[2:4]}/{SHA256}.pdf"
+
+
+@pytest.fixture
+def client(tmp_path):
+    object_file = tmp_path / OBJECT_URL[len("/uploads/"):]
+    object_file.parent.mkdir(parents=True)
+    object_file.write_bytes(CONTENT)
+    legacy = tmp_path / "ticket_attachments" / "ticket_abc.txt"
+    legacy.parent.mkdir()
+    legacy.write_bytes(b"legacy")
+    partial = tmp_path / "incoming" / "x.part"
+    partial.parent.mkdir()
+    partial.write_bytes(b"partial")
+    app = Starlette(routes=[Mount("/uploads", UploadsStaticFiles(directory=str(tmp_path)))])
+    return TestClient(app)
+
+
+def test_content_addressed_file_is_immutable_with_its_hash_as_etag(client):
+    response = client.get(OBJECT_URL)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{SHA256}"'
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_legacy_file_is_immutable_too(client):
+    response = client.get("/uploads/ticket_attachments/ticket_abc.txt")
+    assert response.status_code == 200
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["etag"].startswith('"')
+
+
+def test_if_none_match_answers_304(client):
+    response = client.get(OBJECT_URL, headers={"If-None-Match": f'"{SHA256}"'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{SHA256}"'
+
+
+def test_range_request_answers_206(client):
+    response = client.get(OBJECT_URL, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[:10]
+    assert response.headers["content-range"] == f"bytes 0-9/{len(CONTENT)}"
+
+
+def test_if_range_is_checked_against_the_sent_etag(client):
+    resumed = client.get(OBJECT_URL, headers={"Range": "bytes=0-9", "If-Range": f'"{SHA256}"'})
+    assert resumed.status_code == 206
+    assert resumed.content == CONTENT[:10]
+
+    stale = client.get(OBJECT_URL, headers={"Range": "bytes=0-9", "If-Range": '"something-else"'})
+    assert stale.status_code == 200
+    assert stale.content == CONTENT
+
+
+def test_unsatisfiable_range_answers_416(client):
+    response = client.get(OBJECT_URL, headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+
+
+def test_partial_uploads_are_not_served(client):
+    assert client.get("/uploads/incoming/x.part").status_code == 404
+
+
+@pytest.mark.anyio
+async def test_pathsend_hands_the_file_to_the_server(tmp_path):
+    file_path = tmp_path / "file.bin"
+    file_path.write_bytes(CONTENT)
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [], "extensions": {"http.response.pathsend": {}}}
+    await UploadFileResponse(str(file_path), stat_result=os.stat(file_path))(scope, None, send)
+
+    assert [m["type"] for m in messages] == ["http.response.start", "http.response.pathsend"]
+    assert messages[1]["path"] == str(file_path)
@@ -0,0 +1,106 @@
+import io
+from urllib.parse import urlparse
+import pytest
+from starlette.datastructures import UploadFile
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import migrate
+import utils.uploads as uploads
+from config import settings
+from utils.storage import S3Storage
+
+pytestmark = pytest.mark.anyio
+
+BUCKET = "teen-theory-test"
+
+
+@pytest.fixture
+def s3(db, tmp_path, monkeypatch):
+    """S3Storage against moto's in-process S3, installed as the upload backend."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    for name, value in {"S3_BUCKET": BUCKET, "S3_REGION": "us-east-1", "S3_ENDPOINT_URL": None}.items():
+        monkeypatch.setattr(settings, name, value)
+    with moto.mock_aws():
+        storage = S3Storage()
+        storage.client.create_bucket(Bucket=BUCKET)
+        monkeypatch.setattr(uploads, "storage", storage)
+        monkeypatch.setattr(migrate, "storage", storage)
+        yield storage
+
+
+def read_object(storage, key):
+    return storage.client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+async def test_put_exists_delete_and_presigned_url(s3, tmp_path):
+    local_file = tmp_path / "photo.jpg"
+    local_file.write_bytes(b"jpeg bytes")
+
+    assert not await s3.exists("objects/aa/bb/photo.jpg")
+    await s3.put(str(local_file), "objects/aa/bb/photo.jpg", "image/jpeg")
+    assert await s3.exists("objects/aa/bb/photo.jpg")
+    assert read_object(s3, "objects/aa/bb/photo.jpg") == b"jpeg bytes"
+
+    url = urlparse(await s3.download_url("objects/aa/bb/photo.jpg"))
+    assert url.path.endswith("/objects/aa/bb/photo.jpg")
+    assert "Signature" in url.query or "X-Amz-Signature" in url.query
+
+    await s3.delete("objects/aa/bb/photo.jpg")
+    assert not await s3.exists("objects/aa/bb/photo.jpg")
+
+
+async def test_objects_are_stored_with_an_immutable_cache_policy(s3, tmp_path):
+    local_file = tmp_path / "photo.jpg"
+    local_file.write_bytes(b"jpeg bytes")
+    await s3.put(str(local_file), "objects/aa/bb/photo.jpg", "image/jpeg")
+
+    head = s3.client.head_object(Bucket=BUCKET, Key="objects/aa/bb/photo.jpg")
+    assert head["CacheControl"] == f"public, max-age={settings.UPLOADS_CACHE_MAX_AGE_SECONDS}, immutable"
+    assert head["ContentType"] == "image/jpeg"
+
+
+async def test_download_redirect_is_cacheable_until_shortly_before_the_url_expires(s3, monkeypatch):
+    monkeypatch.setattr(settings, "S3_PRESIGNED_URL_SECONDS", 3600)
+    response = await s3.download_redirect("objects/aa/bb/photo.jpg")
+
+    assert response.status_code == 307
+    assert urlparse(response.headers["location"]).path.endswith("/objects/aa/bb/photo.jpg")
+    assert response.headers["cache-control"] == "private, max-age=3240"
+
+
+async def test_uploads_are_deduplicated_and_released_in_the_bucket(s3):
+    first = await uploads.save_upload(UploadFile(io.BytesIO(b"pdf"), filename="a.pdf"), 100)
+    await uploads.save_upload(UploadFile(io.BytesIO(b"pdf"), filename="b.pdf"), 100)
+    key = uploads.storage_key(first["path"])
+    assert read_object(s3, key) == b"pdf"
+
+    await uploads.delete_upload(first["path"])
+    assert await s3.exists(key)
+    await uploads.delete_upload(first["path"])
+    assert not await s3.exists(key)
+
+
+async def test_copy_uploads_to_storage_copies_referenced_and_legacy_files(s3, tmp_path):
+    legacy = tmp_path / "uploads" / "profile_photos" / "user_1_abc.jpg"
+    orphan = tmp_path / "uploads" / "objects" / "00" / "11" / "orphan.txt"
+    partial = tmp_path / "uploads" / "incoming" / "x.part"
+    for file_path in (legacy, orphan, partial):
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(b"data")
+    referenced = tmp_path / "uploads" / "objects" / "22" / "33" / "kept.txt"
+    referenced.parent.mkdir(parents=True)
+    referenced.write_bytes(b"kept")
+    await migrate.get_stored_files_collection().insert_one({"_id": "/uploads/objects/22/33/kept.txt", "refs": 1})
+
+    assert await migrate.copy_uploads_to_storage() == "2 file(s) copied, 1 skipped"
+    assert read_object(s3, "profile_photos/user_1_abc.jpg") == b"data"
+    assert read_object(s3, "objects/22/33/kept.txt") == b"kept"
+    assert not await s3.exists("objects/00/11/orphan.txt")
+    assert not await s3.exists("incoming/x.part")
+
+    # re-running skips what is already in the bucket
+    assert await migrate.copy_uploads_to_storage() == "0 file(s) copied, 3 skipped"
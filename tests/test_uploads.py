@@ -0,0 +1,72 @@
+import io
+from fastapi import HTTPException
+from starlette.datastructures import UploadFile
+import pytest
+import utils.uploads as uploads
+from db.database import get_stored_files_collection
+from utils.storage import LocalStorage
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def local_storage(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = LocalStorage()
+    monkeypatch.setattr(uploads, "storage", storage)
+    return tmp_path
+
+
+def upload(content: bytes, filename: str = "report.pdf") -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename)
+
+
+async def refs(path):
+    stored = await get_stored_files_collection().find_one({"_id": path})
+    return stored and stored["refs"]
+
+
+async def test_identical_content_is_stored_once_and_counted(local_storage):
+    first = await uploads.save_upload(upload(b"same bytes"), 100)
+    second = await uploads.save_upload(upload(b"same bytes", "copy.PDF"), 100)
+
+    assert first["path"] == second["path"]
+    assert first["path"] == f"/uploads/objects/{first['sha256'][:2]}/{first['sha256'][2:4]}/{first['sha256']}.pdf"
+    assert first["size"] == 10
+    assert await refs(first["path"]) == 2
+    assert (local_storage / first["path"].lstrip("/")).read_bytes() == b"same bytes"
+    assert list((local_storage / "uploads" / "incoming").iterdir()) == []
+
+
+async def test_object_is_removed_with_its_last_reference(local_storage):
+    path = (await uploads.save_upload(upload(b"a"), 100))["path"]
+    await uploads.save_upload(upload(b"a"), 100)
+    file_path = local_storage / path.lstrip("/")
+
+    await uploads.delete_upload(path)
+    assert await refs(path) == 1
+    assert file_path.exists()
+
+    await uploads.delete_upload(path)
+    assert await refs(path) is None
+    assert not file_path.exists()
+
+
+async def test_oversized_upload_is_rejected_without_a_reference(local_storage):
+    with pytest.raises(HTTPException) as exc:
+        await uploads.save_upload(upload(b"x" * 11), 10)
+    assert exc.value.status_code == 413
+    assert await get_stored_files_collection().count_documents({}) == 0
+    assert list((local_storage / "uploads" / "incoming").iterdir()) == []
+
+
+async def test_untracked_files_are_only_removed_on_request(local_storage):
+    legacy = local_storage / "uploads" / "profile_photos" / "user_1_abc.jpg"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(b"legacy")
+
+    await uploads.delete_upload("/uploads/profile_photos/user_1_abc.jpg")
+    assert legacy.exists()
+
+    await uploads.delete_upload("/uploads/profile_photos/user_1_abc.jpg", remove_untracked=True)
+    assert not legacy.exists()
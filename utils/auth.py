@@ -1,8 +1,20 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
+from bson import ObjectId
+import asyncio
 import bcrypt
+import secrets
+import threading
+import time
 from config import settings
+from db.database import get_user_collection, get_admin_collection, get_revoked_tokens_collection
+
+security = HTTPBearer()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hashed password"""
@@ -14,6 +26,76 @@ def get_password_hash(password: str) -> str:
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
+class PasswordWorkerPool:
+    """Runs bcrypt on a dedicated, size-limited thread pool.
+
+    bcrypt releases the GIL, so hashing on these threads keeps the event loop
+    free for other requests. Once `workers + max_queue` jobs are pending, new
+    jobs are rejected with a 429 instead of piling up behind a login storm.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def run(self, func, *args):
+        with self._lock:
+            saturated = self.pending >= self.workers + self.max_queue
+            if saturated:
+                self.rejected += 1
+            else:
+                self.pending += 1
+        if saturated:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts in progress, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        # the job keeps its slot until its thread is done with it, even if the awaiting request is cancelled
+        future.add_done_callback(self._job_done)
+        return await asyncio.wrap_future(future)
+
+    def _job_done(self, future):
+        # called on the worker thread (or by shutdown for jobs that never started)
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordWorkerPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """`verify_password` on the password worker pool; raises 429 when it is saturated"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """`get_password_hash` on the password worker pool; raises 429 when it is saturated"""
+    return await password_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -31,3 +113,224 @@ def verify_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+def generate_token():
+    """Generate a Laravel-style token"""
+    token_id = secrets.randbelow(100)
+    random_part = secrets.token_hex(32)
+    return f"{token_id}|{random_part}"
+
+def new_session_token(user_doc: dict, scope: str = "user"):
+    """Create the bearer token handed out at login/registration.
+
+    Returns `(token, fields)`; `fields` must be `$set` on the user document.
+    With JWT_AUTH_ENABLED the token is a signed JWT carrying the user's id,
+    email and role, otherwise an opaque token that is looked up in Mongo.
+    """
+    if not settings.JWT_AUTH_ENABLED:
+        token = generate_token()
+        return token, {"token": token}
+
+    jti = secrets.token_hex(16)
+    claims = {
+        "sub": str(user_doc["_id"]),
+        "id": user_doc.get("id"),
+        "email": user_doc.get("email"),
+        "role": user_doc.get("user_role"),
+        "scope": scope,
+        "jti": jti,
+    }
+    # The opaque token is cleared so only the new JWT is valid
+    return create_access_token(claims), {"token": None, "token_jti": jti}
+
+async def end_previous_session(user_doc: dict, scope: str = "user"):
+    """Invalidate whatever token was issued to `user_doc` before a new one replaces it."""
+    cache = admin_token_cache if scope == "admin" else user_token_cache
+    cache.invalidate_user(user_doc["_id"])
+    if user_doc.get("token_jti"):
+        await revoked_tokens.revoke(user_doc["token_jti"])
+
+
+class TokenCache:
+    """Bounded LRU cache of token -> user document with a per-entry TTL.
+
+    Entries are dropped after `ttl` seconds, when the cache exceeds `maxsize`,
+    or explicitly via `invalidate_user` whenever a user's token or document changes.
+    The cache is per process: `invalidate_user` only affects the calling worker,
+    other workers keep serving their copy for up to `ttl` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+
+    def get(self, token: str) -> Optional[dict]:
+        entry = self._entries.get(token)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        # shallow copy so handlers can't mutate the cached document
+        return dict(entry[1])
+
+    def set(self, token: str, user: dict):
+        if self.maxsize <= 0:
+            return
+        self._remove(token)
+        self._entries[token] = (time.monotonic() + self.ttl, user)
+        self._tokens_by_user.setdefault(str(user.get("_id")), set()).add(token)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token belonging to the user with this `_id`."""
+        for token in self._tokens_by_user.pop(str(user_id), set()):
+            self._entries.pop(token, None)
+
+    def invalidate_users(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate_user(user_id)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is not None:
+            tokens = self._tokens_by_user.get(str(entry[1].get("_id")))
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    self._tokens_by_user.pop(str(entry[1].get("_id")), None)
+
+
+async def _resolve_token(token: str, collection, cache: TokenCache) -> Optional[dict]:
+    user = cache.get(token)
+    if user is None:
+        user = await collection.find_one({"token": token})
+        if user:
+            cache.set(token, user)
+            # same shallow copy a cache hit returns, so the caller can't mutate the cached document
+            user = dict(user)
+    return user
+
+
+class RevocationList:
+    """Revoked JWT ids, kept in memory and shared across workers via the revoked_tokens collection.
+
+    Lookups never hit the database; the in-memory set is refreshed from Mongo
+    at most once every TOKEN_REVOCATION_REFRESH_SECONDS. A revocation takes
+    effect immediately only in the worker that made it; other workers pick it
+    up on their next refresh.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._revoked = {}
+        self._last_refresh = 0.0
+
+    def is_revoked(self, jti: str) -> bool:
+        expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > datetime.utcnow()
+
+    async def revoke(self, jti: str):
+        # A token can't outlive its expiry, so neither does its revocation entry
+        expires_at = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        self._revoked[jti] = expires_at
+        await get_revoked_tokens_collection().update_one(
+            {"jti": jti}, {"$set": {"jti": jti, "expires_at": expires_at}}, upsert=True
+        )
+
+    async def refresh_if_stale(self):
+        now = time.monotonic()
+        if now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+        cursor = get_revoked_tokens_collection().find({"expires_at": {"$gt": datetime.utcnow()}}, {"jti": 1, "expires_at": 1})
+        self._revoked = {doc["jti"]: doc["expires_at"] async for doc in cursor}
+
+
+user_token_cache = TokenCache(settings.TOKEN_CACHE_MAX_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+admin_token_cache = TokenCache(settings.TOKEN_CACHE_MAX_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+revoked_tokens = RevocationList(settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+
+
+async def _verify_session_token(token: str, scope: str) -> Optional[dict]:
+    """Verify a session JWT locally; returns its claims, or None if invalid, revoked or for another scope."""
+    claims = verify_token(token)
+    if not claims or claims.get("scope") != scope or not claims.get("sub"):
+        return None
+    try:
+        await revoked_tokens.refresh_if_stale()
+    except Exception:
+        # keep serving from the last known list if Mongo is briefly unavailable
+        pass
+    if revoked_tokens.is_revoked(claims.get("jti")):
+        return None
+    return claims
+
+
+async def _authenticate(token: str, scope: str, full_document: bool = False) -> Optional[dict]:
+    if scope == "admin":
+        collection, cache = get_admin_collection(), admin_token_cache
+    else:
+        collection, cache = get_user_collection(), user_token_cache
+
+    # Opaque tokens (and JWT mode being off) fall back to the cached Mongo lookup
+    if not settings.JWT_AUTH_ENABLED or token.count(".") != 2:
+        return await _resolve_token(token, collection, cache)
+
+    claims = await _verify_session_token(token, scope)
+    if claims is None:
+        return None
+    if full_document:
+        return await collection.find_one({"_id": ObjectId(claims["sub"])})
+    # Identity-only view of the user, built from the claims without a DB round-trip
+    return {
+        "_id": ObjectId(claims["sub"]),
+        "id": claims.get("id"),
+        "email": claims.get("email"),
+        "user_role": claims.get("role"),
+    }
+
+
+async def authenticate_user_token(token: str) -> Optional[dict]:
+    """Resolve a raw user token outside of a request dependency (e.g. WebSockets)."""
+    return await _authenticate(token, "user")
+
+
+async def get_token_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
+    """FastAPI dependency: resolve the bearer token to a user, or None if it is unknown.
+
+    In JWT mode only the identity fields carried by the token (`_id`, `id`,
+    `email`, `user_role`) are present; use `get_token_user_document` when
+    the full profile is needed.
+    """
+    return await _authenticate(credentials.credentials, "user")
+
+
+async def get_token_user_document(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
+    """FastAPI dependency: like `get_token_user`, but always the full stored user document."""
+    return await _authenticate(credentials.credentials, "user", full_document=True)
+
+
+async def get_token_admin(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
+    """FastAPI dependency: resolve the bearer token to an admin, or None if it is unknown.
+
+    In JWT mode the admin check relies on the token's `admin` scope and the
+    identity comes from its claims, without a DB lookup; use
+    `get_token_admin_document` when the stored admin document is needed.
+    """
+    return await _authenticate(credentials.credentials, "admin")
+
+
+async def get_token_admin_document(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
+    """FastAPI dependency: like `get_token_admin`, but always the full stored admin document."""
+    return await _authenticate(credentials.credentials, "admin", full_document=True)
@@ -0,0 +1,132 @@
+from fastapi.encoders import jsonable_encoder
+from db.database import get_chats_collection
+from config import settings
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_message(message: dict) -> dict:
+    """JSON-safe copy of a stored chat message, as pushed to WebSocket clients."""
+    message = dict(message)
+    message["_id"] = str(message.get("_id"))
+    return jsonable_encoder(message)
+
+
+class LocalBroker:
+    """Single-worker backend: messages published by this process are delivered directly."""
+
+    hub = None
+
+    async def start(self):
+        pass
+
+    async def publish(self, conversation_id: str, message: dict):
+        self.hub.deliver(conversation_id, message)
+
+    async def stop(self):
+        pass
+
+
+class MongoChangeStreamBroker:
+    """Multi-worker backend: every worker tails inserts into `chats` through a change stream.
+
+    The insert done by /chat/send is the event, so `publish` is a no-op and
+    messages sent through any worker reach subscribers on all of them.
+    Change streams need MongoDB running as a replica set.
+    """
+
+    hub = None
+
+    def __init__(self, retry_seconds: float = 5):
+        self.retry_seconds = retry_seconds
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def publish(self, conversation_id: str, message: dict):
+        pass
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                stream = await get_chats_collection().watch([{"$match": {"operationType": "insert"}}])
+                async with stream:
+                    async for change in stream:
+                        message = change["fullDocument"]
+                        self.hub.deliver(message.get("conversation_id"), serialize_message(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chat change stream failed, retrying in {self.retry_seconds}s: {e}")
+                await asyncio.sleep(self.retry_seconds)
+
+
+BROKERS = {
+    "local": LocalBroker,
+    "mongo": MongoChangeStreamBroker,
+}
+
+
+class ChatHub:
+    """Per-conversation pub/sub used to push new chat messages to WebSocket subscribers.
+
+    Each subscriber gets a bounded queue; a subscriber that falls
+    `queue_size` messages behind misses the overflow and can catch up
+    through /chat/messages.
+    """
+
+    def __init__(self, broker, queue_size: int = 100):
+        self.broker = broker
+        self.broker.hub = self
+        self.queue_size = queue_size
+        self._subscribers = {}
+
+    async def start(self):
+        await self.broker.start()
+
+    async def stop(self):
+        await self.broker.stop()
+
+    def subscribe(self, conversation_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(conversation_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, conversation_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(conversation_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                self._subscribers.pop(conversation_id, None)
+
+    async def publish(self, conversation_id: str, message: dict):
+        """Announce a message that was just stored for `conversation_id`."""
+        await self.broker.publish(conversation_id, serialize_message(message))
+
+    def deliver(self, conversation_id: str, message: dict):
+        """Hand a message to this worker's subscribers of `conversation_id`."""
+        for queue in self._subscribers.get(conversation_id, ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                logger.warning(f"Dropping chat message for a slow subscriber of conversation {conversation_id}")
+
+    def stats(self) -> dict:
+        return {
+            "conversations": len(self._subscribers),
+            "subscribers": sum(len(q) for q in self._subscribers.values()),
+        }
+
+
+chat_hub = ChatHub(BROKERS[settings.CHAT_BROKER](), settings.CHAT_SUBSCRIBER_QUEUE_SIZE)
@@ -0,0 +1,48 @@
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+def normalize_project_id(project_id):
+    """Project ids are stored as ints; accept numeric strings too, anything else as a string."""
+    if isinstance(project_id, int):
+        return project_id
+    value = str(project_id).strip()
+    return int(value) if value.isdigit() else value
+
+
+def conversation_key(project_id, member_emails):
+    """Deterministic key for the conversation between `member_emails` in a project.
+
+    Member order and email case don't matter, and a project id sent as "7"
+    or 7 maps to the same key.
+    """
+    members = sorted({e.strip().lower() for e in member_emails if e})
+    return f"{normalize_project_id(project_id)}:{'|'.join(members)}"
+
+
+async def upsert_conversation(conversation_collection, project_id, member_emails, update=None, created_at=None):
+    """Return the conversation for `member_emails` in a project, creating it if needed, in one round-trip.
+
+    `update` is applied to the conversation in the same call. The unique
+    index on `conversation_key` makes concurrent first messages converge on
+    one document; the loser of that race simply retries as an update.
+    """
+    key = conversation_key(project_id, member_emails)
+    update = dict(update or {})
+    update["$setOnInsert"] = {
+        "conversation_key": key,
+        "project_id": normalize_project_id(project_id),
+        "members": list(member_emails),
+        "created_at": created_at,
+    }
+    for attempt in range(2):
+        try:
+            return await conversation_collection.find_one_and_update(
+                {"conversation_key": key},
+                update,
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            if attempt:
+                raise
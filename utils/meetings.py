@@ -0,0 +1,28 @@
+def normalize_student_emails(assigned):
+    """Canonical lower-cased email list from an `assigned_students` value.
+
+    Accepts a list of emails, a comma-separated string or a single string.
+    """
+    if assigned is None:
+        return []
+    if isinstance(assigned, list):
+        candidates = [str(x) for x in assigned if x is not None]
+    elif isinstance(assigned, str):
+        candidates = assigned.split(",")
+    else:
+        candidates = [str(assigned)]
+
+    emails = []
+    for candidate in candidates:
+        email = candidate.strip().lower()
+        if email and email not in emails:
+            emails.append(email)
+    return emails
+
+
+def meeting_student_emails(meeting):
+    """`normalize_student_emails` for a stored meeting, including legacy `Assigned_students` documents."""
+    assigned = meeting.get("assigned_students")
+    if assigned is None:
+        assigned = meeting.get("Assigned_students")
+    return normalize_student_emails(assigned)
@@ -0,0 +1,65 @@
+from fastapi import HTTPException, Query, status
+from typing import Optional
+from bson import json_util
+from config import settings
+import base64
+
+
+class PageParams:
+    """Query parameters shared by every paginated listing: `limit` and an opaque `after` cursor."""
+
+    def __init__(
+        self,
+        limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+        after: Optional[str] = Query(None, description="`next_cursor` from the previous page"),
+    ):
+        self.limit = limit
+        self.after = after
+
+
+def encode_cursor(doc, sort_field="_id"):
+    """Opaque cursor pointing just past `doc` in a listing ordered by (`sort_field`, `_id`)."""
+    key = [doc.get("_id")] if sort_field == "_id" else [doc.get(sort_field), doc.get("_id")]
+    return base64.urlsafe_b64encode(json_util.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor, sort_field="_id"):
+    try:
+        key = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        key = None
+    if not isinstance(key, list) or len(key) != (1 if sort_field == "_id" else 2):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+    return key
+
+
+def keyset_filter(key, sort_field="_id", direction=1):
+    """Query matching the documents that come after `key` in (`sort_field`, `_id`) order."""
+    op = "$gt" if direction == 1 else "$lt"
+    if sort_field == "_id":
+        return {"_id": {op: key[0]}}
+    value, last_id = key
+    return {"$or": [{sort_field: {op: value}}, {sort_field: value, "_id": {op: last_id}}]}
+
+
+async def paginate(collection, query, page: PageParams, sort_field="_id", direction=1, projection=None):
+    """Fetch one page of `collection.find(query)` ordered by (`sort_field`, `_id`).
+
+    Returns `(docs, pagination)` where `pagination` is the envelope returned
+    to clients alongside `data`.
+    """
+    if page.after:
+        after_filter = keyset_filter(decode_cursor(page.after, sort_field), sort_field, direction)
+        query = {"$and": [query, after_filter]} if query else after_filter
+
+    sort = [("_id", direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+    # one extra document tells us whether another page exists
+    docs = await collection.find(query, projection).sort(sort).limit(page.limit + 1).to_list(None)
+    has_more = len(docs) > page.limit
+    docs = docs[:page.limit]
+
+    return docs, {
+        "limit": page.limit,
+        "next_cursor": encode_cursor(docs[-1], sort_field) if has_more else None,
+        "has_more": has_more,
+    }
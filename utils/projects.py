@@ -0,0 +1,259 @@
+from bson import ObjectId
+from datetime import datetime
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+
+def extract_assigned_ids(entries):
+    """Return the stringified user ObjectIds referenced by an assigned_student/assigned_mentor list.
+
+    Entries may be dicts carrying an `id` key or bare id strings.
+    """
+    if isinstance(entries, dict):
+        entries = [entries]
+    ids = []
+    for entry in entries or []:
+        value = entry.get("id") if isinstance(entry, dict) else entry
+        if value and str(value) not in ids:
+            ids.append(str(value))
+    return ids
+
+
+def extract_assigned_emails(entries):
+    """Return the lower-cased emails referenced by an assigned_student/assigned_mentor list.
+
+    Entries may be dicts carrying an `email` key or bare email strings.
+    """
+    if isinstance(entries, dict):
+        entries = [entries]
+    emails = []
+    for entry in entries or []:
+        value = entry.get("email") if isinstance(entry, dict) else entry
+        if isinstance(value, str) and "@" in value and value.strip().lower() not in emails:
+            emails.append(value.strip().lower())
+    return emails
+
+
+def build_assignment_fields(assigned_students, assigned_mentors):
+    """Normalized multikey fields stored on a project so assignments can be looked up by index."""
+    return {
+        "assigned_student_ids": extract_assigned_ids(assigned_students),
+        "assigned_mentor_ids": extract_assigned_ids(assigned_mentors),
+        "assigned_student_emails": extract_assigned_emails(assigned_students),
+        "assigned_mentor_emails": extract_assigned_emails(assigned_mentors),
+    }
+
+
+def assignment_query(user_doc, roles=("student", "mentor"), by_email=True):
+    """Build a query matching projects where the user is assigned in any of `roles`.
+
+    Matches the normalized id fields and, when `by_email` is set, the nested
+    email paths for entries that only carry an email.
+    """
+    return assignment_query_many([user_doc], roles=roles, by_email=by_email)
+
+
+def assignment_query_many(user_docs, roles=("student", "mentor"), by_email=True):
+    """Like `assignment_query`, matching projects assigned to any of `user_docs`."""
+    user_ids = list({str(u.get("_id")) for u in user_docs if u.get("_id") is not None})
+    emails = list({u.get("email") for u in user_docs if u.get("email")}) if by_email else []
+
+    clauses = []
+    for role in roles:
+        if user_ids:
+            clauses.append({f"assigned_{role}_ids": {"$in": user_ids}})
+        if emails:
+            clauses.append({f"assigned_{role}.email": {"$in": emails}})
+    if not clauses:
+        return None
+    return {"$or": clauses}
+
+
+def get_assigned_keys(project, roles=("student", "mentor")):
+    """Return the (ids, emails) sets of users assigned to `project` in any of `roles`."""
+    ids = set()
+    emails = set()
+    for role in roles:
+        entries = project.get(f"assigned_{role}", []) or []
+        if isinstance(entries, dict):
+            entries = [entries]
+        ids.update(project.get(f"assigned_{role}_ids") or extract_assigned_ids(entries))
+        emails.update(e.get("email") for e in entries if isinstance(e, dict) and e.get("email"))
+    return ids, emails
+
+
+# Bumped whenever the stored shape of milestones/tasks changes; `migrate.py
+# project-schema` rewrites documents with an older version.
+PROJECT_SCHEMA_VERSION = 1
+
+
+def normalize_tasks(tasks):
+    """Canonical task list: every task is a dict with a `status` (default 'pending')."""
+    normalized = []
+    for t in tasks or []:
+        t_copy = dict(t) if isinstance(t, dict) else {"title": t}
+        t_copy.setdefault("status", "pending")
+        normalized.append(t_copy)
+    return normalized
+
+
+def normalize_milestones(milestones, project_id):
+    """Canonical milestone list: dicts with an `id`, a `status` and normalized `tasks`."""
+    normalized = []
+    for idx, m in enumerate(milestones or []):
+        # if milestone provided as primitive, convert to dict with name
+        m_copy = dict(m) if isinstance(m, dict) else {"name": m}
+        if not m_copy.get("id"):
+            m_copy["id"] = f"{project_id}-{idx}-{secrets.token_hex(6)}"
+        m_copy.setdefault("status", "pending")
+        m_copy["tasks"] = normalize_tasks(m_copy.get("tasks"))
+        normalized.append(m_copy)
+    return normalized
+
+
+def normalized_project_fields(project):
+    """Fields to `$set` on a stored project so it matches the canonical schema."""
+    return {
+        "status": project.get("status") or "pending",
+        "milestones": normalize_milestones(project.get("milestones"), project.get("id")),
+        "tasks": normalize_tasks(project.get("tasks")),
+        "schema_version": PROJECT_SCHEMA_VERSION,
+    }
+
+
+async def upgrade_project_schema(project_collection, project_id):
+    """Normalize a single legacy project in place so targeted array updates can address it."""
+    project = await project_collection.find_one({"id": project_id}, {"id": 1, "status": 1, "milestones": 1, "tasks": 1})
+    if project:
+        # guarded so a concurrent upgrade can't overwrite updates made after the first one
+        await project_collection.update_one(
+            {"_id": project["_id"], "schema_version": {"$ne": PROJECT_SCHEMA_VERSION}},
+            {"$set": normalized_project_fields(project)},
+        )
+
+
+def milestone_status_update(project_id, status, milestone_id=None, milestone_name=None, task_title=None,
+                            attachment_path=None, include_tasks=True, now=None):
+    """Build the `(query, update, array_filters)` for one targeted milestone/task status write.
+
+    Matches the milestone by `milestone_id`, else by `milestone_name`; with
+    neither, every milestone is updated. With `include_tasks` the status is
+    also set on the milestone's tasks, or only on the task titled
+    `task_title` when given. `attachment_path` is pushed to the milestone
+    and to the same tasks. A query that matches nothing means no such
+    milestone/task exists.
+    """
+    query = {"id": project_id}
+    array_filters = []
+    if milestone_id or milestone_name:
+        milestone_match = {"id": milestone_id} if milestone_id else {"name": milestone_name}
+        milestone_path = "milestones.$[m]"
+        array_filters.append({f"m.{key}": value for key, value in milestone_match.items()})
+        # If task_title provided, update only that task
+        if include_tasks and task_title:
+            milestone_match["tasks.title"] = task_title
+            task_path = f"{milestone_path}.tasks.$[t]"
+            array_filters.append({"t.title": task_title})
+        else:
+            task_path = f"{milestone_path}.tasks.$[]"
+        query["milestones"] = {"$elemMatch": milestone_match}
+    else:
+        milestone_path = "milestones.$[]"
+        task_path = f"{milestone_path}.tasks.$[]"
+
+    now = now or datetime.utcnow()
+    paths = [milestone_path, task_path] if include_tasks else [milestone_path]
+    update = {"$set": {f"{path}.status": status for path in paths}}
+    update["$set"][f"{milestone_path}.updated_at"] = now
+    update["$set"]["updated_at"] = now
+    if attachment_path:
+        update["$push"] = {f"{path}.attachments": attachment_path for path in paths}
+    return query, update, array_filters
+
+
+# Per-user array holding the embedded summary of each project, by assignment role
+USER_PROJECT_FIELDS = {"student": "current_projects", "mentor": "assigned_projects"}
+
+
+def assigned_object_ids(entries):
+    """`extract_assigned_ids` as ObjectIds, skipping values that aren't valid ids."""
+    object_ids = []
+    for value in extract_assigned_ids(entries):
+        if ObjectId.is_valid(value):
+            object_ids.append(ObjectId(value))
+    return object_ids
+
+
+async def add_project_references(user_collection, project):
+    """Push the project's embedded summary onto every assigned user; one `update_many` per role.
+
+    Returns the assigned ids, by role, that don't match any user.
+    """
+    project_summary = {
+        "project_id": project.get("id"),
+        "title": project.get("title"),
+        "status": project.get("status"),
+        "assigned_date": datetime.utcnow(),
+    }
+    unknown = {}
+    for role, field in USER_PROJECT_FIELDS.items():
+        requested = extract_assigned_ids(project.get(f"assigned_{role}"))
+        user_ids = assigned_object_ids(requested)
+        found = set()
+        eligible = []
+        if user_ids:
+            async for user in user_collection.find({"_id": {"$in": user_ids}}, {field: 1}):
+                found.add(user["_id"])
+                # $push fails the whole batch on a non-array value, so such users are skipped
+                if isinstance(user.get(field, []), list):
+                    eligible.append(user["_id"])
+                else:
+                    logger.warning(f"Not adding project {project.get('id')} to user {user['_id']}: {field} is not a list")
+        if eligible:
+            await user_collection.update_many(
+                {"_id": {"$in": eligible}, "$or": [{field: {"$exists": False}}, {field: {"$type": "array"}}]},
+                {"$push": {field: project_summary}},
+            )
+        unknown[role] = [value for value in requested if not (ObjectId.is_valid(value) and ObjectId(value) in found)]
+    return unknown
+
+
+def project_status_updates(project, new_status):
+    """Build the `(query, update, array_filters)` of each role's `update_many` for `propagate_project_status`.
+
+    Roles without a valid assigned user id are left out.
+    """
+    project_id = project.get("id")
+    updates = []
+    for role, field in USER_PROJECT_FIELDS.items():
+        user_ids = assigned_object_ids(project.get(f"assigned_{role}"))
+        if user_ids:
+            updates.append((
+                {"_id": {"$in": user_ids}, f"{field}.project_id": project_id},
+                {"$set": {f"{field}.$[p].status": new_status}},
+                [{"p.project_id": project_id}],
+            ))
+    return updates
+
+
+async def propagate_project_status(user_collection, project, new_status):
+    """Set `new_status` on the project's embedded summary for every assigned user.
+
+    One `update_many` per role; re-running it is harmless.
+    """
+    for query, update, array_filters in project_status_updates(project, new_status):
+        await user_collection.update_many(query, update, array_filters=array_filters)
+
+
+async def remove_project_references(user_collection, project):
+    """Pull the project's embedded summary from every assigned user; one `update_many` per role."""
+    project_id = project.get("id")
+    for role, field in USER_PROJECT_FIELDS.items():
+        user_ids = assigned_object_ids(project.get(f"assigned_{role}"))
+        if user_ids:
+            await user_collection.update_many(
+                {"_id": {"$in": user_ids}},
+                {"$pull": {field: {"project_id": project_id}}},
+            )
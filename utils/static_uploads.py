@@ -0,0 +1,78 @@
+from starlette.exceptions import HTTPException
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from config import settings
+import os
+import re
+
+# objects/<aa>/<bb>/<sha256><ext>, as written by utils.uploads
+CONTENT_ADDRESSED_KEY = re.compile(r"^objects/[0-9a-f]{2}/[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(\.[^/]*)?$")
+
+
+class UploadFileResponse(FileResponse):
+    """FileResponse that lets the server send whole files itself when it can.
+
+    Servers offering the ASGI `http.response.pathsend` extension get just
+    the file path and can use sendfile(); otherwise (uvicorn, range and HEAD
+    requests) the body is streamed by Starlette as usual, in larger chunks.
+    """
+
+    chunk_size = 256 * 1024
+
+    def _should_use_range(self, http_if_range, stat_result) -> bool:
+        # FileResponse compares If-Range with its own md5 ETag; use the one actually sent
+        return http_if_range in (self.headers.get("etag"), self.headers.get("last-modified"))
+
+    async def __call__(self, scope, receive, send):
+        headers = Headers(scope=scope)
+        if (
+            "http.response.pathsend" in scope.get("extensions", {})
+            and scope["method"].upper() != "HEAD"
+            and "range" not in headers
+            and self.stat_result is not None
+        ):
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+            if self.background is not None:
+                await self.background()
+            return
+        await super().__call__(scope, receive, send)
+
+
+class UploadsStaticFiles(StaticFiles):
+    """Static handler for /uploads tuned for files that never change once written.
+
+    - Every file is sent with `Cache-Control: immutable`: content-addressed
+      files are named by their content, and older uploads have unique random
+      names and are never rewritten either.
+    - Content-addressed files use their SHA-256 as a strong ETag, older
+      files one built from size and mtime.
+    - `If-None-Match` / `If-Modified-Since` answer 304, and single or
+      multiple byte ranges (with `If-Range` checked against that ETag) are
+      handled by FileResponse.
+    - Partial uploads still being written are never served.
+    """
+
+    def get_path(self, scope) -> str:
+        path = super().get_path(scope)
+        if path.replace(os.sep, "/").startswith("incoming/"):
+            raise HTTPException(status_code=404)
+        return path
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        key = self.get_path(scope).replace(os.sep, "/")
+        match = CONTENT_ADDRESSED_KEY.match(key)
+        if match:
+            etag = f'"{match.group("sha256")}"'
+        else:
+            etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+        headers = {
+            "etag": etag,
+            "cache-control": f"public, max-age={settings.UPLOADS_CACHE_MAX_AGE_SECONDS}, immutable",
+        }
+
+        response = UploadFileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
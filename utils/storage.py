@@ -0,0 +1,126 @@
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import RedirectResponse
+from config import settings
+import os
+
+
+def _remove_quietly(file_path: str):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+class LocalStorage:
+    """Keeps uploads on this instance's disk under `root`, served by the /uploads mount.
+
+    Only suitable for a single instance: other workers on other machines
+    can't see the files.
+    """
+
+    serves_locally = True
+
+    def __init__(self, root: str = "uploads"):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def _put(self, file_path: str, key: str):
+        destination = self._path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        # a rename, not a copy: identical content already on disk is simply overwritten in place
+        os.replace(file_path, destination)
+
+    async def put(self, file_path: str, key: str, content_type: str = None):
+        """Move the local file at `file_path` into storage under `key`."""
+        await run_in_threadpool(self._put, file_path, key)
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(os.path.isfile, self._path(key))
+
+    async def delete(self, key: str):
+        await run_in_threadpool(_remove_quietly, self._path(key))
+
+    async def download_url(self, key: str) -> str:
+        return f"/{self.root}/{key}"
+
+
+class S3Storage:
+    """Keeps uploads in an S3-compatible bucket (AWS S3, MinIO, ...).
+
+    Clients download through short-lived presigned URLs, so file bytes
+    never pass through the API workers. Needs the `boto3` package.
+    """
+
+    serves_locally = False
+
+    def __init__(self):
+        import boto3
+
+        self.bucket = settings.S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+        )
+
+    def _put(self, file_path: str, key: str, content_type: str = None):
+        # uploads never change once written, same policy as the local /uploads handler
+        extra_args = {"CacheControl": f"public, max-age={settings.UPLOADS_CACHE_MAX_AGE_SECONDS}, immutable"}
+        if content_type:
+            extra_args["ContentType"] = content_type
+        self.client.upload_file(file_path, self.bucket, key, ExtraArgs=extra_args)
+
+    def _exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def put(self, file_path: str, key: str, content_type: str = None):
+        """Upload the local file at `file_path` under `key`; the caller removes the local copy."""
+        await run_in_threadpool(self._put, file_path, key, content_type)
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(self._exists, key)
+
+    async def delete(self, key: str):
+        await run_in_threadpool(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def download_url(self, key: str) -> str:
+        return await run_in_threadpool(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=settings.S3_PRESIGNED_URL_SECONDS,
+        )
+
+    async def download_redirect(self, key: str) -> RedirectResponse:
+        """Redirect to a presigned URL for `key` that clients may cache.
+
+        The redirect stays cacheable until shortly before the URL expires, so
+        clients keep requesting the same signed URL, and their cached copy of
+        the object keeps matching it, instead of a freshly signed one each time.
+        """
+        expires_in = settings.S3_PRESIGNED_URL_SECONDS
+        max_age = max(expires_in - max(expires_in // 10, 60), 0)
+        return RedirectResponse(
+            await self.download_url(key),
+            headers={"Cache-Control": f"private, max-age={max_age}"},
+        )
+
+
+STORAGE_BACKENDS = {
+    "local": LocalStorage,
+    "s3": S3Storage,
+}
+
+storage = STORAGE_BACKENDS[settings.STORAGE_BACKEND]()
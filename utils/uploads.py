@@ -0,0 +1,145 @@
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+from pymongo import ReturnDocument
+from db.database import get_stored_files_collection
+from utils.storage import storage
+from config import settings
+import hashlib
+import os
+import secrets
+
+UPLOAD_ROOT = "uploads"
+# Uploads are streamed here first, then handed to storage once their hash is known
+INCOMING_DIR = os.path.join(UPLOAD_ROOT, "incoming")
+
+
+def public_path(key: str) -> str:
+    """Stable /uploads/... path stored in documents for the storage object `key`."""
+    return f"/{UPLOAD_ROOT}/{key}"
+
+
+def storage_key(path: str):
+    """Storage object key for a public /uploads/... path, or None for anything else."""
+    prefix = f"/{UPLOAD_ROOT}/"
+    return path[len(prefix):] if path and path.startswith(prefix) else None
+
+
+def object_key(sha256: str, extension: str) -> str:
+    """Sharded content-addressed key: objects/<aa>/<bb>/<sha256><ext>."""
+    return f"objects/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def _remove_quietly(file_path: str):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+async def _stream_to_incoming(upload: UploadFile, max_bytes: int):
+    """Stream `upload` into INCOMING_DIR, returning `(partial_path, size, sha256)`.
+
+    Every disk operation runs on the thread pool. The size limit is enforced
+    while streaming, so an oversized upload is rejected with 413 as soon as
+    it crosses `max_bytes` and its partial file is removed.
+    """
+    await run_in_threadpool(os.makedirs, INCOMING_DIR, exist_ok=True)
+    partial_path = os.path.join(INCOMING_DIR, f"{secrets.token_hex(16)}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await run_in_threadpool(open, partial_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"{upload.filename or 'Upload'} exceeds the {max_bytes} byte limit",
+                )
+            digest.update(chunk)
+            await run_in_threadpool(buffer.write, chunk)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(_remove_quietly, partial_path)
+        raise
+    await run_in_threadpool(buffer.close)
+    return partial_path, size, digest.hexdigest()
+
+
+async def save_upload(upload: UploadFile, max_bytes: int) -> dict:
+    """Store `upload` in the content-addressed store and take a reference to it.
+
+    Identical content (same bytes and extension) maps to one storage object
+    and one stable URL no matter how often it is uploaded, and is only
+    written to storage when it isn't there yet; the `stored_files`
+    collection counts the references so `delete_upload` knows when the
+    object can go. The SHA-256 is computed while streaming, so nothing is
+    read twice.
+
+    Returns `{"path", "size", "sha256", "filename", "content_type"}` where
+    `path` is the public /uploads/objects/... path.
+    """
+    partial_path, size, sha256 = await _stream_to_incoming(upload, max_bytes)
+    extension = os.path.splitext(upload.filename or "")[1].lower()
+    key = object_key(sha256, extension)
+    path = public_path(key)
+
+    try:
+        # Count the reference before the object is stored: a delete that checks
+        # the count after this keeps the object. One that already removed the
+        # record can still delete the object right after this put; that window
+        # is narrow and accepted rather than locking every upload.
+        stored = await get_stored_files_collection().find_one_and_update(
+            {"_id": path},
+            {
+                "$inc": {"refs": 1},
+                "$setOnInsert": {"sha256": sha256, "size": size},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if stored["refs"] == 1 or not await storage.exists(key):
+            await storage.put(partial_path, key, upload.content_type)
+    finally:
+        await run_in_threadpool(_remove_quietly, partial_path)
+
+    return {
+        "path": path,
+        "size": size,
+        "sha256": sha256,
+        "filename": upload.filename,
+        "content_type": upload.content_type,
+    }
+
+
+async def delete_upload(path: str, remove_untracked: bool = False):
+    """Drop one reference to a file previously returned by `save_upload` (given its public path).
+
+    The object is removed once nothing references it anymore. Untracked
+    files (saved before the content-addressed store, without a
+    `stored_files` record) are left alone, as copies of their path may
+    still be embedded in other documents, unless `remove_untracked` is set.
+    """
+    key = storage_key(path)
+    if not key:
+        return
+
+    stored_files = get_stored_files_collection()
+    stored = await stored_files.find_one_and_update(
+        {"_id": path},
+        {"$inc": {"refs": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if stored is None:
+        if remove_untracked and not key.startswith("objects/"):
+            await storage.delete(key)
+        return
+    if stored["refs"] <= 0:
+        # only the caller that actually removes the record removes the object
+        result = await stored_files.delete_one({"_id": path, "refs": {"$lte": 0}})
+        if result.deleted_count:
+            await storage.delete(key)
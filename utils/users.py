@@ -0,0 +1,65 @@
+def build_public_profile(user_doc):
+    """Small, non-sensitive view of a user embedded in other resources."""
+    return {
+        "_id": str(user_doc.get("_id")),
+        "id": user_doc.get("id"),
+        "full_name": user_doc.get("full_name"),
+        "email": user_doc.get("email"),
+        "profile_photo": user_doc.get("profile_photo"),
+        "user_role": user_doc.get("user_role"),
+    }
+
+
+PUBLIC_PROFILE_PROJECTION = {"id": 1, "full_name": 1, "email": 1, "profile_photo": 1, "user_role": 1}
+
+
+async def get_public_profiles(user_collection, emails):
+    """Resolve many emails to public profiles with one `$in` query.
+
+    Returns a dict keyed by email; unknown emails are simply absent.
+    """
+    emails = list({e for e in emails if e})
+    if not emails:
+        return {}
+    profiles = {}
+    async for user in user_collection.find({"email": {"$in": emails}}, PUBLIC_PROFILE_PROJECTION):
+        profiles[user.get("email")] = build_public_profile(user)
+    return profiles
+
+
+def person_field_email(field):
+    """Email referenced by a person field stored as an email string or a dict with `email`."""
+    if isinstance(field, str) and "@" in field:
+        return field
+    if isinstance(field, dict) and field.get("email"):
+        return field.get("email")
+    return None
+
+
+async def resolve_person_fields(user_collection, docs, fields):
+    """Replace each person field in `docs` (in place) with a public profile.
+
+    All referenced emails are fetched with a single query. Fields that already
+    hold a profile (a dict with `_id`) only get their `_id` stringified, and
+    unresolvable values are left as stored.
+    """
+    emails = []
+    for doc in docs:
+        for field in fields:
+            value = doc.get(field)
+            if not (isinstance(value, dict) and value.get("_id")):
+                emails.append(person_field_email(value))
+    profiles = await get_public_profiles(user_collection, emails)
+
+    for doc in docs:
+        for field in fields:
+            value = doc.get(field)
+            if not value:
+                continue
+            if isinstance(value, dict) and value.get("_id"):
+                value_copy = dict(value)
+                value_copy["_id"] = str(value_copy.get("_id"))
+                doc[field] = value_copy
+            else:
+                doc[field] = profiles.get(person_field_email(value), value)
+    return docs